@@ -1,38 +1,133 @@
 """
 Configuration settings for Pain Detection System
 Adjust these parameters to fine-tune the system behavior
+
+Settings dicts are read-only views (MappingProxyType); edit the values in
+this file rather than mutating them at runtime.
 """
 
+import itertools
+import math
 import os
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+import numpy as np
 
 # ============================================================================
 # PROJECT PATHS
 # ============================================================================
-BASE_DIR = Path(__file__).parent
-SRC_DIR = BASE_DIR / "src"
-DATA_DIR = BASE_DIR / "data"
-OUTPUT_DIR = BASE_DIR / "outputs"
-TEST_DIR = BASE_DIR / "tests"
+BASE_DIR_STR = os.path.dirname(os.path.abspath(__file__))
+
+# Attribute name -> directory under BASE_DIR_STR. The Path objects are only
+# built when first accessed (see __getattr__ below), so importing config
+# does no path arithmetic.
+_DIR_NAMES = {
+    "SRC_DIR": "src",
+    "DATA_DIR": "data",
+    "OUTPUT_DIR": "outputs",
+    "TEST_DIR": "tests",
+}
+
+
+@lru_cache(maxsize=None)
+def _dir_path(name: str) -> Path:
+    """Path for BASE_DIR or one of the _DIR_NAMES entries (cached)"""
+    if name == "BASE_DIR":
+        return Path(BASE_DIR_STR)
+    return Path(os.path.join(BASE_DIR_STR, _DIR_NAMES[name]))
 
-# Create directories if they don't exist
-for directory in [DATA_DIR, OUTPUT_DIR, TEST_DIR]:
+
+def __getattr__(name: str):
+    # Keeps config.BASE_DIR, config.DATA_DIR, ... working without eager Paths
+    if name == "BASE_DIR" or name in _DIR_NAMES:
+        return _dir_path(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def _ensure(directory: Path) -> Path:
+    """Create a directory on first use (cached, so later calls cost nothing)"""
     directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+# Directories are created lazily; code that writes files should use these
+def get_data_dir() -> Path:
+    return _ensure(_dir_path("DATA_DIR"))
+
+
+def get_output_dir() -> Path:
+    return _ensure(_dir_path("OUTPUT_DIR"))
+
+
+def get_test_dir() -> Path:
+    return _ensure(_dir_path("TEST_DIR"))
+
 
 # ============================================================================
 # MEDIAPIPE SETTINGS
 # ============================================================================
-MEDIAPIPE_CONFIG = {
+MEDIAPIPE_CONFIG = MappingProxyType({
     "max_num_faces": 1,
     "refine_landmarks": True,
     "min_detection_confidence": 0.5,
     "min_tracking_confidence": 0.5,
-}
+})
+
+# Frames with a longer side than this are downscaled (aspect kept) before
+# Face Mesh; landmarks are normalized, so callers see no difference
+MAX_PROCESS_SIDE = 640
+
+
+@lru_cache(maxsize=1)
+def get_face_mesh():
+    """
+    Shared MediaPipe FaceMesh built from MEDIAPIPE_CONFIG
+    
+    Graph construction takes seconds, so it happens once on first call and
+    later callers reuse the instance. MediaPipe is imported here to keep
+    importing config cheap.
+    
+    The graph keeps tracking state between process() calls and is not
+    thread-safe: feed it one video stream, from one thread at a time.
+    """
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(**MEDIAPIPE_CONFIG)
+
+
+def warmup_face_mesh(background: bool = False):
+    """
+    Build the shared FaceMesh ahead of first use
+    
+    Args:
+        background: Build on a daemon thread so app launch is not blocked
+    
+    Returns:
+        threading.Thread if background is True, otherwise None
+    """
+    if not background:
+        get_face_mesh()
+        return None
+    
+    import threading
+    thread = threading.Thread(target=get_face_mesh, name="face-mesh-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def release_face_mesh():
+    """Close the shared FaceMesh (if built) so the next get_face_mesh() rebuilds it"""
+    if get_face_mesh.cache_info().currsize:
+        get_face_mesh().close()
+        get_face_mesh.cache_clear()
 
 # ============================================================================
 # FACIAL LANDMARKS FOR PAIN INDICATORS
 # ============================================================================
-LANDMARK_INDICES = {
+LANDMARK_INDICES = MappingProxyType({
     "eyebrow_left": [70, 107],
     "eyebrow_right": [336, 300],
     "mouth_corners": [61, 291],
@@ -43,55 +138,122 @@ LANDMARK_INDICES = {
     "jaw_right": [454, 323],
     "nasolabial_left": [48],
     "nasolabial_right": [278],
-}
+})
+
+# All indices in one contiguous array, with a slice per group, so consumers
+# can gather every pain landmark at once: pts = landmarks[LANDMARK_FLAT]
+LANDMARK_FLAT = np.fromiter(
+    itertools.chain.from_iterable(LANDMARK_INDICES.values()), dtype=np.int32
+)
+_offsets = [0, *itertools.accumulate(len(v) for v in LANDMARK_INDICES.values())]
+LANDMARK_SLICES = MappingProxyType({
+    name: slice(start, stop)
+    for name, start, stop in zip(LANDMARK_INDICES, _offsets, _offsets[1:])
+})
 
 # ============================================================================
 # PAIN SCORING WEIGHTS
 # ============================================================================
-PAIN_WEIGHTS = {
+# Edit weights here; PAIN_WEIGHTS_VEC below is derived from this dict
+PAIN_WEIGHTS = MappingProxyType({
     "brow_tension": 0.25,      # 25% contribution to overall score
     "grimace": 0.30,            # 30% contribution
     "eye_squint": 0.20,         # 20% contribution
     "jaw_clench": 0.20,         # 20% contribution
     "nasolabial": 0.05,         # 5% contribution
-}
+})
+
+# Fixed indicator order so the overall score is a single dot product:
+# score = indicator_scores @ PAIN_WEIGHTS_VEC
+PAIN_INDICATOR_ORDER = ("brow_tension", "grimace", "eye_squint", "jaw_clench", "nasolabial")
+PAIN_WEIGHTS_VEC = np.array(
+    [PAIN_WEIGHTS[name] for name in PAIN_INDICATOR_ORDER], dtype=np.float32
+)
 
 # ============================================================================
 # THRESHOLDS
 # ============================================================================
-PAIN_THRESHOLDS = {
+PAIN_THRESHOLDS = MappingProxyType({
     "low": 3.0,      # Pain score < 3: Green (low pain)
     "medium": 6.0,   # Pain score 3-6: Yellow (moderate pain)
     "high": 10.0,    # Pain score > 6: Red (high pain)
-}
+})
 
-CONFIDENCE_THRESHOLDS = {
+CONFIDENCE_THRESHOLDS = MappingProxyType({
     "high": 0.80,    # >= 80% confidence
     "medium": 0.60,  # 60-80% confidence
     "low": 0.40,     # < 60% confidence
-}
+})
 
 # Quality thresholds
-FACE_DETECTION_QUALITY = {
+FACE_DETECTION_QUALITY = MappingProxyType({
     "excellent": 0.9,
     "good": 0.75,
     "fair": 0.6,
     "poor": 0.4,
-}
+})
 
 LIGHTING_QUALITY_THRESHOLD = 50  # Minimum average brightness
 
+# Sorted bin edges + labels derived from the dicts above, so classifying a
+# score is a single binary search. Edges stay float64 so a score exactly on
+# a threshold lands in the same bucket as the original >= comparisons.
+PAIN_EDGES = np.array([PAIN_THRESHOLDS["low"], PAIN_THRESHOLDS["medium"]])
+PAIN_LABELS = ("low", "medium", "high")
+
+CONFIDENCE_EDGES = np.array([CONFIDENCE_THRESHOLDS["medium"], CONFIDENCE_THRESHOLDS["high"]])
+CONFIDENCE_LABELS = ("Low", "Medium", "High")
+
+QUALITY_EDGES = np.array([
+    FACE_DETECTION_QUALITY["fair"],
+    FACE_DETECTION_QUALITY["good"],
+    FACE_DETECTION_QUALITY["excellent"],
+])
+QUALITY_LABELS = ("Poor", "Fair", "Good", "Excellent")
+
+
+def classify_pain(score: float) -> str:
+    """Pain level label ('low'/'medium'/'high') for a 0-10 pain score (NaN/inf -> lowest)"""
+    if not math.isfinite(score):
+        return PAIN_LABELS[0]
+    return PAIN_LABELS[int(np.searchsorted(PAIN_EDGES, score, side="right"))]
+
+
+def classify_confidence(score: float) -> str:
+    """Confidence level label for a 0-1 confidence score (NaN/inf -> lowest)"""
+    if not math.isfinite(score):
+        return CONFIDENCE_LABELS[0]
+    return CONFIDENCE_LABELS[int(np.searchsorted(CONFIDENCE_EDGES, score, side="right"))]
+
+
+def classify_quality(score: float) -> str:
+    """Face detection quality label for a 0-1 quality score (NaN/inf -> lowest)"""
+    if not math.isfinite(score):
+        return QUALITY_LABELS[0]
+    return QUALITY_LABELS[int(np.searchsorted(QUALITY_EDGES, score, side="right"))]
+
 # ============================================================================
 # TEMPORAL ANALYSIS
 # ============================================================================
-TEMPORAL_WINDOW_SECONDS = 30  # Track pain over last 30 seconds
-UPDATE_FREQUENCY = 0.5         # Update every 0.5 seconds
-BUFFER_SIZE = int(TEMPORAL_WINDOW_SECONDS / UPDATE_FREQUENCY)  # 60 samples
+# Primary values are integer milliseconds so the slot count is exact and
+# timers can compare against time.monotonic_ns() // 1_000_000 without drift
+TEMPORAL_WINDOW_MS = 30_000    # Track pain over last 30 seconds
+TEMPORAL_UPDATE_MS = 500       # Update every 0.5 seconds
+
+if TEMPORAL_WINDOW_MS % TEMPORAL_UPDATE_MS:
+    raise ValueError("TEMPORAL_WINDOW_MS must be a whole multiple of TEMPORAL_UPDATE_MS")
+
+BUFFER_SIZE = TEMPORAL_WINDOW_MS // TEMPORAL_UPDATE_MS  # 60 samples
+
+# Seconds-based aliases kept for existing callers
+TEMPORAL_WINDOW_SECONDS = TEMPORAL_WINDOW_MS // 1000
+UPDATE_FREQUENCY = TEMPORAL_UPDATE_MS / 1000
+TEMPORAL_DTYPE = np.float32    # Sample dtype for temporal buffers (see src.utils.RingBuffer)
 
 # ============================================================================
 # DISPLAY SETTINGS
 # ============================================================================
-DISPLAY_CONFIG = {
+DISPLAY_CONFIG = MappingProxyType({
     "window_name": "Pain Detection System",
     "window_width": 1280,
     "window_height": 720,
@@ -99,63 +261,244 @@ DISPLAY_CONFIG = {
     "show_landmarks": True,
     "show_indicators": True,
     "show_score": True,
-}
+})
 
-# Color codes (BGR format for OpenCV)
-COLORS = {
-    "green": (0, 255, 0),
-    "yellow": (0, 255, 255),
-    "red": (0, 0, 255),
-    "blue": (255, 0, 0),
-    "white": (255, 255, 255),
-    "black": (0, 0, 0),
-    "gray": (128, 128, 128),
-}
+
+class DisplaySettings(NamedTuple):
+    """Typed, immutable view of DISPLAY_CONFIG for attribute access in hot loops"""
+    window_name: str
+    window_width: int
+    window_height: int
+    fps: int
+    show_landmarks: bool
+    show_indicators: bool
+    show_score: bool
+
+
+DISPLAY = DisplaySettings(**DISPLAY_CONFIG)
+
+# Color codes (BGR format for OpenCV), packed into one uint8 table
+COLOR_IDX = MappingProxyType({
+    "green": 0,
+    "yellow": 1,
+    "red": 2,
+    "blue": 3,
+    "white": 4,
+    "black": 5,
+    "gray": 6,
+})
+COLORS_ARR = np.array([
+    [0, 255, 0],
+    [0, 255, 255],
+    [0, 0, 255],
+    [255, 0, 0],
+    [255, 255, 255],
+    [0, 0, 0],
+    [128, 128, 128],
+], dtype=np.uint8)
+
+# cv2 drawing functions reject uint8 arrays as a color Scalar, so keep
+# plain int tuples (derived from the table once) for putText/rectangle.
+# COLORS_ARR rows are for vectorized pixel writes into uint8 images.
+COLORS = MappingProxyType({
+    name: tuple(int(c) for c in COLORS_ARR[i]) for name, i in COLOR_IDX.items()
+})
 
 # ============================================================================
 # REPORT SETTINGS
 # ============================================================================
-REPORT_CONFIG = {
-    "save_format": ["json", "txt", "image"],
+REPORT_CONFIG = MappingProxyType({
+    "save_format": ("json", "txt", "image"),  # Tuple, so the read-only mapping stays immutable
     "include_landmarks": True,
     "include_temporal_data": True,
     "timestamp_format": "%Y-%m-%d %H:%M:%S",
-}
+})
 
 # ============================================================================
 # BASELINE CALIBRATION
 # ============================================================================
-BASELINE_CONFIG = {
+BASELINE_CONFIG = MappingProxyType({
     "required": False,           # Whether baseline is mandatory
     "capture_duration": 3.0,     # Seconds to capture neutral expression
     "num_samples": 30,           # Number of frames to average
-}
+})
 
 # ============================================================================
 # ERROR HANDLING
 # ============================================================================
-ERROR_MESSAGES = {
+ERROR_MESSAGES = MappingProxyType({
     "no_face": "No face detected. Please ensure your face is visible and well-lit.",
     "multiple_faces": "Multiple faces detected. Please ensure only one person is in frame.",
     "poor_lighting": "Poor lighting conditions detected. Please improve lighting.",
     "partial_face": "Face partially obscured. Please ensure full face visibility.",
     "low_confidence": "Low detection confidence. Results may be unreliable.",
-}
+})
 
 # ============================================================================
 # LOGGING SETTINGS
 # ============================================================================
-LOGGING_CONFIG = {
+LOGGING_CONFIG = MappingProxyType({
     "level": "INFO",  # DEBUG, INFO, WARNING, ERROR, CRITICAL
     "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    "log_file": OUTPUT_DIR / "pain_detection.log",
-}
+    "log_file": "pain_detection.log",  # Relative to OUTPUT_DIR, see get_log_path()
+})
+
+
+def get_log_path() -> Path:
+    """Full path of the log file (creates the outputs directory on first call)"""
+    return get_output_dir() / LOGGING_CONFIG["log_file"]
+
+
+def setup_logging():
+    """
+    Send root logging to the log file using LOGGING_CONFIG
+    
+    Call explicitly from entry points; importing config never opens the
+    file, and the handler itself only opens it on the first record.
+    """
+    import logging
+    
+    handler = logging.FileHandler(get_log_path(), encoding="utf-8", delay=True)
+    logging.basicConfig(
+        level=LOGGING_CONFIG["level"],
+        format=LOGGING_CONFIG["format"],
+        handlers=[handler],
+    )
 
 # ============================================================================
 # VALIDATION & TESTING
 # ============================================================================
-VALIDATION_CONFIG = {
+VALIDATION_CONFIG = MappingProxyType({
     "test_mode": False,
     "benchmark_mode": False,
     "save_debug_images": False,
-}
+})
+
+# ============================================================================
+# TYPED CONFIG
+# ============================================================================
+# One frozen container mirroring the dicts above. Attribute access on a
+# NamedTuple is a tuple index, cheaper than nested dict lookups in hot code
+# (e.g. CONFIG.pain.grimace instead of PAIN_WEIGHTS["grimace"]).
+
+class MediaPipeSettings(NamedTuple):
+    max_num_faces: int
+    refine_landmarks: bool
+    min_detection_confidence: float
+    min_tracking_confidence: float
+
+
+class PainWeights(NamedTuple):
+    brow_tension: float
+    grimace: float
+    eye_squint: float
+    jaw_clench: float
+    nasolabial: float
+
+
+class PainThresholds(NamedTuple):
+    low: float
+    medium: float
+    high: float
+
+
+class ConfidenceThresholds(NamedTuple):
+    high: float
+    medium: float
+    low: float
+
+
+class QualityThresholds(NamedTuple):
+    excellent: float
+    good: float
+    fair: float
+    poor: float
+
+
+class Thresholds(NamedTuple):
+    pain: PainThresholds
+    confidence: ConfidenceThresholds
+    quality: QualityThresholds
+    lighting: float
+
+
+class ReportSettings(NamedTuple):
+    save_format: tuple
+    include_landmarks: bool
+    include_temporal_data: bool
+    timestamp_format: str
+
+
+class BaselineSettings(NamedTuple):
+    required: bool
+    capture_duration: float
+    num_samples: int
+
+
+class LoggingSettings(NamedTuple):
+    level: str
+    format: str
+    log_file: str
+
+
+class ValidationSettings(NamedTuple):
+    test_mode: bool
+    benchmark_mode: bool
+    save_debug_images: bool
+
+
+class Config(NamedTuple):
+    mediapipe: MediaPipeSettings
+    pain: PainWeights
+    thresholds: Thresholds
+    buffer_size: int
+    display: DisplaySettings
+    report: ReportSettings
+    baseline: BaselineSettings
+    logging: LoggingSettings
+    validation: ValidationSettings
+
+
+CONFIG = Config(
+    mediapipe=MediaPipeSettings(**MEDIAPIPE_CONFIG),
+    pain=PainWeights(**PAIN_WEIGHTS),
+    thresholds=Thresholds(
+        pain=PainThresholds(**PAIN_THRESHOLDS),
+        confidence=ConfidenceThresholds(**CONFIDENCE_THRESHOLDS),
+        quality=QualityThresholds(**FACE_DETECTION_QUALITY),
+        lighting=LIGHTING_QUALITY_THRESHOLD,
+    ),
+    buffer_size=BUFFER_SIZE,
+    display=DISPLAY,
+    report=ReportSettings(**REPORT_CONFIG),
+    baseline=BaselineSettings(**BASELINE_CONFIG),
+    logging=LoggingSettings(**LOGGING_CONFIG),
+    validation=ValidationSettings(**VALIDATION_CONFIG),
+)
+
+# ============================================================================
+# SANITY CHECKS
+# ============================================================================
+def _validate():
+    """Fail at import if the settings above are inconsistent"""
+    if abs(float(PAIN_WEIGHTS_VEC.sum()) - 1.0) > 1e-6:
+        raise ValueError("PAIN_WEIGHTS must sum to 1.0")
+    if not np.all((PAIN_WEIGHTS_VEC >= 0) & (PAIN_WEIGHTS_VEC <= 1)):
+        raise ValueError("PAIN_WEIGHTS must each be within [0, 1]")
+    
+    # Bin edges must be strictly increasing for searchsorted
+    for name, edges in (("PAIN_THRESHOLDS", PAIN_EDGES),
+                        ("CONFIDENCE_THRESHOLDS", CONFIDENCE_EDGES),
+                        ("FACE_DETECTION_QUALITY", QUALITY_EDGES)):
+        if not np.all(np.diff(edges) > 0):
+            raise ValueError(f"{name} must be strictly increasing")
+    if not (PAIN_EDGES[-1] < PAIN_THRESHOLDS["high"]
+            and CONFIDENCE_THRESHOLDS["low"] < CONFIDENCE_EDGES[0]
+            and FACE_DETECTION_QUALITY["poor"] < QUALITY_EDGES[0]):
+        raise ValueError("Threshold dicts are out of order")
+    
+    if COLORS_ARR.dtype != np.uint8 or COLORS_ARR.shape != (len(COLOR_IDX), 3):
+        raise ValueError("COLORS_ARR must be a (num_colors, 3) uint8 table")
+
+
+_validate()
@@ -0,0 +1,4 @@
+"""
+Pain Detection System Package
+Face detection, landmark extraction, quality validation and pain analyzers
+"""
@@ -7,20 +7,99 @@ import cv2
 import mediapipe as mp
 import numpy as np
 from typing import Optional, Tuple, List, Dict
-import sys
-from pathlib import Path
 
-# Add parent directory to path for imports
-sys.path.append(str(Path(__file__).parent.parent))
+# config lives in the project root, which entry points put on sys.path
+from config import (
+    COLOR_IDX,
+    COLORS_ARR,
+    CONFIG,
+    LIGHTING_QUALITY_THRESHOLD,
+    MAX_PROCESS_SIDE,
+    MEDIAPIPE_CONFIG,
+    classify_quality,
+    get_face_mesh
+)
+from .logger import setup_logger, get_logger
+from .utils import check_lighting_quality, njit, resize_image
 
-from config import MEDIAPIPE_CONFIG, FACE_DETECTION_QUALITY, LIGHTING_QUALITY_THRESHOLD
-from src.logger import setup_logger, get_logger
-from src.utils import check_lighting_quality
+
+# Pixel offsets covered by a filled cv2.circle of radius 1
+_DOT_OFFSETS = np.array([[0, 0], [1, 0], [-1, 0], [0, 1], [0, -1]], dtype=np.int32)
+
+# uint8 BGR row written straight into the image, no tuple conversion per call
+_DOT_COLOR = COLORS_ARR[COLOR_IDX["green"]]
+
+
+# Metadata returned by detect() before any field is filled in
+_DEFAULT_METADATA = {
+    'num_faces': 0,
+    'quality_score': 0.0,
+    'lighting_score': 0.0,
+    'lighting_quality': 'Unknown',
+    'warnings': None
+}
+
+@njit(cache=True, fastmath=True)
+def _face_metrics(landmarks):
+    """
+    Single sweep over the landmarks for the quality and visibility checks
+    
+    Args:
+        landmarks: Landmark array (N, 3)
+    
+    Returns:
+        Tuple of (mean_x, mean_y, min_x, max_x, min_y, max_y, var_z,
+                  eye_distance, nose_offset)
+    """
+    n = landmarks.shape[0]
+    sum_x = 0.0
+    sum_y = 0.0
+    sum_z = 0.0
+    sum_z2 = 0.0
+    min_x = max_x = float(landmarks[0, 0])
+    min_y = max_y = float(landmarks[0, 1])
+    
+    for i in range(n):
+        x = float(landmarks[i, 0])
+        y = float(landmarks[i, 1])
+        z = float(landmarks[i, 2])
+        sum_x += x
+        sum_y += y
+        sum_z += z
+        sum_z2 += z * z
+        if x < min_x:
+            min_x = x
+        elif x > max_x:
+            max_x = x
+        if y < min_y:
+            min_y = y
+        elif y > max_y:
+            max_y = y
+    
+    mean_z = sum_z / n
+    var_z = max(sum_z2 / n - mean_z * mean_z, 0.0)
+    
+    # Eye distance (x, y) and nose tip offset from the eye midpoint
+    left_x = float(landmarks[33, 0])
+    right_x = float(landmarks[263, 0])
+    dx = left_x - right_x
+    dy = float(landmarks[33, 1]) - float(landmarks[263, 1])
+    eye_distance = (dx * dx + dy * dy) ** 0.5
+    nose_offset = abs(float(landmarks[1, 0]) - (left_x + right_x) / 2)
+    
+    return sum_x / n, sum_y / n, min_x, max_x, min_y, max_y, var_z, eye_distance, nose_offset
 
 
 class FaceDetector:
     """
     MediaPipe Face Mesh wrapper for detecting faces and extracting landmarks
+    
+    A detector built with the default MEDIAPIPE_CONFIG settings uses the
+    shared graph from config.get_face_mesh(). Face Mesh tracks landmarks
+    across calls and its process() is not thread-safe, so every user of
+    that graph must feed the same single video stream from one thread;
+    give each other stream a detector with non-default settings, which
+    builds (and closes) its own graph.
     """
     
     def __init__(self, 
@@ -40,24 +119,43 @@ class FaceDetector:
         self.logger = setup_logger(__name__)
         
         # Use config defaults if not specified
-        config = MEDIAPIPE_CONFIG
-        self.max_num_faces = max_num_faces or config['max_num_faces']
-        self.min_detection_confidence = min_detection_confidence or config['min_detection_confidence']
-        self.min_tracking_confidence = min_tracking_confidence or config['min_tracking_confidence']
-        self.refine_landmarks = refine_landmarks if refine_landmarks is not None else config['refine_landmarks']
-        
-        # Initialize MediaPipe Face Mesh
+        config = CONFIG.mediapipe
+        self.max_num_faces = max_num_faces or config.max_num_faces
+        self.min_detection_confidence = min_detection_confidence or config.min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence or config.min_tracking_confidence
+        self.refine_landmarks = refine_landmarks if refine_landmarks is not None else config.refine_landmarks
+        
+        # Initialize MediaPipe Face Mesh; default settings reuse the shared
+        # graph from config, since building one is expensive
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=self.max_num_faces,
-            refine_landmarks=self.refine_landmarks,
-            min_detection_confidence=self.min_detection_confidence,
-            min_tracking_confidence=self.min_tracking_confidence
-        )
+        settings = {
+            'max_num_faces': self.max_num_faces,
+            'refine_landmarks': self.refine_landmarks,
+            'min_detection_confidence': self.min_detection_confidence,
+            'min_tracking_confidence': self.min_tracking_confidence
+        }
+        self._shared_mesh = settings == dict(MEDIAPIPE_CONFIG)
+        if self._shared_mesh:
+            self.face_mesh = get_face_mesh()
+        else:
+            self.face_mesh = self.mp_face_mesh.FaceMesh(**settings)
+        
+        # Compile the metrics kernel now rather than on the first frame
+        _face_metrics(np.zeros((468, 3), dtype=np.float32))
+        
+        # Reused RGB scratch buffer, and the last processed frame/results so
+        # draw_landmarks_mediapipe() after detect() skips a second inference
+        self._rgb_buf = None
+        self._last_image = None
+        self._last_results = None
         
-        # For drawing landmarks
+        # For drawing landmarks (connection sets and styles built once)
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
+        self._tess_conn = self.mp_face_mesh.FACEMESH_TESSELATION
+        self._contour_conn = self.mp_face_mesh.FACEMESH_CONTOURS
+        self._tess_spec = self.mp_drawing_styles.get_default_face_mesh_tesselation_style()
+        self._contour_spec = self.mp_drawing_styles.get_default_face_mesh_contours_style()
         
         self.logger.info("FaceDetector initialized successfully")
     
@@ -73,42 +171,34 @@ class FaceDetector:
                 - success (bool): Whether face was detected
                 - landmarks (np.ndarray): Array of shape (468, 3) with x, y, z coordinates
                 - metadata (dict): Additional information about detection
+                  (lighting fields stay 'Unknown'/0.0 when no face is found)
         """
-        metadata = {
-            'num_faces': 0,
-            'detection_confidence': 0.0,
-            'face_visible': False,
-            'quality_score': 0.0,
-            'lighting_score': 0.0,
-            'lighting_quality': 'Unknown',
-            'warnings': []
-        }
+        # Fresh warnings list per call; the template itself is never mutated
+        metadata = {**_DEFAULT_METADATA, 'warnings': []}
         
         if image is None or image.size == 0:
             self.logger.warning("Empty or invalid image provided")
             metadata['warnings'].append("Invalid image")
             return False, None, metadata
         
-        # Check lighting quality
-        brightness, lighting_quality = check_lighting_quality(image)
-        metadata['lighting_score'] = float(brightness)
-        metadata['lighting_quality'] = lighting_quality
-        
-        if brightness < LIGHTING_QUALITY_THRESHOLD:
-            metadata['warnings'].append(f"Poor lighting detected ({lighting_quality})")
-            self.logger.warning(f"Poor lighting: {brightness:.1f}")
-        
-        # Convert BGR to RGB for MediaPipe
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
         # Process the image
-        results = self.face_mesh.process(image_rgb)
+        results = self._process(image)
         
         # Check if faces were detected
         if not results.multi_face_landmarks:
             self.logger.debug("No faces detected in image")
             return False, None, metadata
         
+        # Check lighting quality (only once a face is found; callers bail on
+        # failure, so idle frames skip this pass)
+        brightness, lighting_quality = check_lighting_quality(image, stride=4)
+        metadata['lighting_score'] = float(brightness)
+        metadata['lighting_quality'] = lighting_quality
+        
+        if brightness < LIGHTING_QUALITY_THRESHOLD:
+            metadata['warnings'].append(f"Poor lighting detected ({lighting_quality})")
+            self.logger.warning(f"Poor lighting: {brightness:.1f}")
+        
         # Get number of faces
         num_faces = len(results.multi_face_landmarks)
         metadata['num_faces'] = num_faces
@@ -125,16 +215,80 @@ class FaceDetector:
         
         # Calculate detection quality
         quality_score = self._calculate_quality_score(landmarks, image.shape)
+        # MediaPipe doesn't report a confidence; QualityValidator uses this
+        # score for both quality and confidence
         metadata['quality_score'] = quality_score
-        metadata['face_visible'] = True
-        
-        # Estimate confidence (MediaPipe doesn't directly provide this)
-        metadata['detection_confidence'] = quality_score
         
         self.logger.debug(f"Face detected successfully. Quality: {quality_score:.2f}")
         
         return True, landmarks, metadata
     
+    def detect_batch(self, frames) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+        """
+        Detect faces in a sequence of frames and stack the landmarks
+        
+        MediaPipe still runs frame by frame (it tracks across frames), but
+        the result is one (N, num_landmarks, 3) array that LandmarkExtractor
+        getters and analyze_batch() methods can process in a single pass.
+        
+        Args:
+            frames: Iterable of images (BGR format from OpenCV), in order
+        
+        Returns:
+            Tuple containing:
+                - found (np.ndarray): (N,) bool, whether a face was detected
+                - landmarks (np.ndarray): (N, num_landmarks, 3) float32; rows
+                  for frames without a face are NaN
+                - metadata (list): Per-frame metadata dicts from detect()
+        """
+        found, stacked, metadata = [], [], []
+        for frame in frames:
+            success, landmarks, meta = self.detect(frame)
+            found.append(success)
+            stacked.append(landmarks)
+            metadata.append(meta)
+        
+        found = np.asarray(found, dtype=bool)
+        num_points = next((lm.shape[0] for lm in stacked if lm is not None), 468)
+        batch = np.full((len(stacked), num_points, 3), np.nan, dtype=np.float32)
+        for i in np.flatnonzero(found):
+            batch[i] = stacked[i]
+        
+        return found, batch, metadata
+    
+    def _process(self, image: np.ndarray, reuse: bool = False):
+        """
+        Run Face Mesh on a BGR image
+        
+        Frames larger than MAX_PROCESS_SIDE are downscaled before inference.
+        
+        Args:
+            image: Input image (BGR format from OpenCV)
+            reuse: Return the results of the last call if it was given this
+                   same array object. Only valid while the caller has not
+                   written new pixels into that buffer, so detect() always
+                   runs inference and only the drawing helper reuses
+        
+        Returns:
+            MediaPipe Face Mesh results
+        """
+        if reuse and image is self._last_image:
+            return self._last_results
+        
+        # Face Mesh works at low resolution internally, so shrink large
+        # frames first; normalized landmarks are unaffected
+        small = resize_image(image, MAX_PROCESS_SIDE, MAX_PROCESS_SIDE)
+        
+        # Convert BGR to RGB for MediaPipe into the reused buffer
+        if self._rgb_buf is None or self._rgb_buf.shape != small.shape:
+            self._rgb_buf = np.empty_like(small)
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        
+        results = self.face_mesh.process(self._rgb_buf)
+        self._last_image = image
+        self._last_results = results
+        return results
+    
     def _extract_landmark_array(self, face_landmarks, image_shape: Tuple[int, int]) -> np.ndarray:
         """
         Extract landmark coordinates as numpy array
@@ -146,14 +300,10 @@ class FaceDetector:
         Returns:
             np.ndarray: Array of shape (468, 3) with normalized coordinates
         """
-        height, width = image_shape[:2]
-        
-        landmarks = np.zeros((len(face_landmarks.landmark), 3), dtype=np.float32)
-        
-        for idx, landmark in enumerate(face_landmarks.landmark):
-            landmarks[idx] = [landmark.x, landmark.y, landmark.z]
-        
-        return landmarks
+        # One bulk conversion instead of a per-landmark row assignment
+        return np.array(
+            [(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark], dtype=np.float32
+        ).reshape(-1, 3)
     
     def _calculate_quality_score(self, landmarks: np.ndarray, image_shape: Tuple[int, int]) -> float:
         """
@@ -166,34 +316,25 @@ class FaceDetector:
         Returns:
             float: Quality score between 0 and 1
         """
-        height, width = image_shape[:2]
+        # Means, bounds, z-variance and eye distance in one pass
+        (face_center_x, face_center_y, min_x, max_x, min_y, max_y,
+         z_variance, eye_distance, _) = _face_metrics(landmarks)
         
         # Check if face is centered and well-positioned
-        face_center_x = np.mean(landmarks[:, 0])
-        face_center_y = np.mean(landmarks[:, 1])
-        
         # Calculate how centered the face is (0 = edge, 1 = center)
         center_x = abs(face_center_x - 0.5) * 2  # 0 at center, 1 at edge
         center_y = abs(face_center_y - 0.5) * 2
         centering_score = 1.0 - ((center_x + center_y) / 2)
         
-        # Check face size (using distance between eyes)
-        left_eye = landmarks[33]  # Left eye landmark
-        right_eye = landmarks[263]  # Right eye landmark
-        eye_distance = np.linalg.norm(left_eye[:2] - right_eye[:2])
-        
+        # Check face size (using distance between eyes 33 and 263)
         # Good face size is when eye distance is 15-35% of image width
         size_score = 1.0 if 0.15 <= eye_distance <= 0.35 else 0.5
         
         # Check landmark confidence (using z-depth variance)
         # Less variance in z means more stable detection
-        z_variance = np.var(landmarks[:, 2])
         depth_score = max(0.5, 1.0 - z_variance * 10)
         
         # Check if face is too close to edges
-        min_x, max_x = np.min(landmarks[:, 0]), np.max(landmarks[:, 0])
-        min_y, max_y = np.min(landmarks[:, 1]), np.max(landmarks[:, 1])
-        
         edge_margin = 0.05  # 5% margin
         edge_score = 1.0
         if min_x < edge_margin or max_x > (1 - edge_margin):
@@ -209,7 +350,8 @@ class FaceDetector:
             edge_score * 0.2
         )
         
-        return float(np.clip(quality_score, 0.0, 1.0))
+        # All inputs are Python floats from the kernel, so no numpy scalars here
+        return min(max(quality_score, 0.0), 1.0)
     
     def get_quality_level(self, quality_score: float) -> str:
         """
@@ -221,19 +363,13 @@ class FaceDetector:
         Returns:
             str: Quality level description
         """
-        if quality_score >= FACE_DETECTION_QUALITY['excellent']:
-            return "Excellent"
-        elif quality_score >= FACE_DETECTION_QUALITY['good']:
-            return "Good"
-        elif quality_score >= FACE_DETECTION_QUALITY['fair']:
-            return "Fair"
-        else:
-            return "Poor"
+        return classify_quality(quality_score)
     
     def draw_landmarks(self, 
                        image: np.ndarray, 
                        landmarks: np.ndarray,
-                       draw_connections: bool = True) -> np.ndarray:
+                       draw_connections: bool = True,
+                       inplace: bool = False) -> np.ndarray:
         """
         Draw face mesh landmarks on image
         
@@ -241,54 +377,59 @@ class FaceDetector:
             image: Input image
             landmarks: Landmark array (468, 3)
             draw_connections: Whether to draw connections between landmarks
+            inplace: Draw directly on image instead of a copy (caller owns
+                     the buffer and accepts that it is modified)
         
         Returns:
             np.ndarray: Image with drawn landmarks
         """
-        annotated_image = image.copy()
+        annotated_image = image if inplace else image.copy()
         height, width = image.shape[:2]
         
-        # Convert normalized landmarks to pixel coordinates
-        for idx, landmark in enumerate(landmarks):
-            x = int(landmark[0] * width)
-            y = int(landmark[1] * height)
-            
-            # Draw landmark point
-            cv2.circle(annotated_image, (x, y), 1, (0, 255, 0), -1)
+        # Convert normalized landmarks to pixel coordinates (truncated like int())
+        coords = (landmarks[:, :2] * np.array([width, height], dtype=np.float32)).astype(np.int32)
+        
+        # Expand each point to the 5-pixel plus that cv2.circle(radius=1) fills,
+        # then write every in-bounds pixel in one assignment
+        pixels = (coords[:, None, :] + _DOT_OFFSETS).reshape(-1, 2)
+        xs, ys = pixels[:, 0], pixels[:, 1]
+        mask = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        annotated_image[ys[mask], xs[mask]] = _DOT_COLOR
         
         return annotated_image
     
-    def draw_landmarks_mediapipe(self, image: np.ndarray) -> np.ndarray:
+    def draw_landmarks_mediapipe(self, image: np.ndarray, inplace: bool = False) -> np.ndarray:
         """
         Draw face mesh using MediaPipe's built-in drawing utilities
         
         Args:
             image: Input image (BGR)
+            inplace: Draw directly on image instead of a copy (caller owns
+                     the buffer and accepts that it is modified)
         
         Returns:
             np.ndarray: Image with drawn face mesh
         """
-        annotated_image = image.copy()
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        results = self.face_mesh.process(image_rgb)
+        # Reuses detect()'s results when called on the same, unmodified frame
+        results = self._process(image, reuse=True)
+        annotated_image = image if inplace else image.copy()
         
         if results.multi_face_landmarks:
             for face_landmarks in results.multi_face_landmarks:
                 self.mp_drawing.draw_landmarks(
                     image=annotated_image,
                     landmark_list=face_landmarks,
-                    connections=self.mp_face_mesh.FACEMESH_TESSELATION,
+                    connections=self._tess_conn,
                     landmark_drawing_spec=None,
-                    connection_drawing_spec=self.mp_drawing_styles.get_default_face_mesh_tesselation_style()
+                    connection_drawing_spec=self._tess_spec
                 )
                 
                 self.mp_drawing.draw_landmarks(
                     image=annotated_image,
                     landmark_list=face_landmarks,
-                    connections=self.mp_face_mesh.FACEMESH_CONTOURS,
+                    connections=self._contour_conn,
                     landmark_drawing_spec=None,
-                    connection_drawing_spec=self.mp_drawing_styles.get_default_face_mesh_contours_style()
+                    connection_drawing_spec=self._contour_spec
                 )
         
         return annotated_image
@@ -319,9 +460,10 @@ class FaceDetector:
         """
         issues = []
         
+        (_, _, min_x, max_x, min_y, max_y,
+         _, eye_distance, nose_offset) = _face_metrics(landmarks)
+        
         # Check if key landmarks are within image bounds
-        min_x, max_x = np.min(landmarks[:, 0]), np.max(landmarks[:, 0])
-        min_y, max_y = np.min(landmarks[:, 1]), np.max(landmarks[:, 1])
         
         margin = 0.02  # 2% margin
         if min_x < margin or max_x > (1 - margin):
@@ -330,20 +472,11 @@ class FaceDetector:
         if min_y < margin or max_y > (1 - margin):
             issues.append("Face too close to top/bottom edge")
         
-        # Check face orientation (using nose and eye landmarks)
-        nose_tip = landmarks[1]
-        left_eye = landmarks[33]
-        right_eye = landmarks[263]
-        
-        # Calculate face rotation
-        eye_center_x = (left_eye[0] + right_eye[0]) / 2
-        nose_offset = abs(nose_tip[0] - eye_center_x)
-        
+        # Check face orientation (nose tip offset from the eye midpoint)
         if nose_offset > 0.05:  # Face is rotated more than 5%
             issues.append("Face not frontal (head turned)")
         
         # Check if face is too far or too close
-        eye_distance = np.linalg.norm(left_eye[:2] - right_eye[:2])
         if eye_distance < 0.10:
             issues.append("Face too far from camera")
         elif eye_distance > 0.45:
@@ -353,12 +486,16 @@ class FaceDetector:
         return is_valid, issues
     
     def close(self):
-        """Release resources"""
-        if hasattr(self, 'face_mesh') and self.face_mesh is not None:
+        """Release resources (the shared FaceMesh is left to config.release_face_mesh())"""
+        if getattr(self, 'face_mesh', None) is not None:
             try:
-                self.face_mesh.close()
+                if not self._shared_mesh:
+                    self.face_mesh.close()
             except:
                 pass  # Ignore errors during cleanup
+            self.face_mesh = None
+        self._last_image = None
+        self._last_results = None
         if hasattr(self, 'logger'):
             self.logger.info("FaceDetector closed")
     
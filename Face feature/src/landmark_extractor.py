@@ -4,24 +4,146 @@ Utilities for extracting and processing specific facial landmarks
 """
 
 import numpy as np
-from typing import Dict, List, Tuple
-import sys
-from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
 
-sys.path.append(str(Path(__file__).parent.parent))
+# config lives in the project root, which entry points put on sys.path
+from config import LANDMARK_INDICES, LANDMARK_FLAT, LANDMARK_SLICES
+from .utils import dist3, njit
 
-from config import LANDMARK_INDICES
-from src.utils import calculate_distance, calculate_angle, calculate_center
+
+# Scalar kernels for the calculate_* metrics. Each takes the metric's
+# landmarks gathered into one contiguous (k, 3) array, in the order given by
+# _METRIC_GROUPS below.
+
+@njit(cache=True, fastmath=True)
+def _dist(p, i, j):
+    dx = p[i, 0] - p[j, 0]
+    dy = p[i, 1] - p[j, 1]
+    dz = p[i, 2] - p[j, 2]
+    return (dx * dx + dy * dy + dz * dz) ** 0.5
+
+
+@njit(cache=True, fastmath=True)
+def _eyebrow_kernel(p):
+    # rows: left[0], left[1], right[0], right[1]
+    left = _dist(p, 0, 1)
+    right = _dist(p, 2, 3)
+    return left, right, _dist(p, 1, 3), (left + right) / 2
+
+
+@njit(cache=True, fastmath=True)
+def _mouth_kernel(p):
+    # rows: corners[0], corners[1], center[0], center[1]
+    center_y = (p[2, 1] + p[3, 1]) / 2
+    left_droop = p[0, 1] - center_y
+    right_droop = p[1, 1] - center_y
+    return _dist(p, 0, 1), _dist(p, 2, 3), left_droop, right_droop, (left_droop + right_droop) / 2
+
+
+@njit(cache=True, fastmath=True)
+def _eye_kernel(p):
+    # rows: left[0], left[1], right[0], right[1]
+    left = _dist(p, 0, 1)
+    right = _dist(p, 2, 3)
+    return left, right, (left + right) / 2, abs(left - right)
+
+
+@njit(cache=True, fastmath=True)
+def _jaw_kernel(p):
+    # rows: left[0], left[1], right[0], right[1]
+    left = _dist(p, 0, 1)
+    right = _dist(p, 2, 3)
+    return left, right, _dist(p, 0, 2), (left + right) / 2
+
+
+@njit(cache=True, fastmath=True)
+def _nasolabial_kernel(p):
+    # rows: left[0], right[0]
+    left = p[0, 2]
+    right = p[1, 2]
+    return left, right, (left + right) / 2, abs(left - right)
+
+
+_METRIC_GROUPS = {
+    'eyebrow': ('eyebrow_left', 'eyebrow_right'),
+    'mouth': ('mouth_corners', 'mouth_center'),
+    'eye': ('eye_left', 'eye_right'),
+    'jaw': ('jaw_left', 'jaw_right'),
+    'nasolabial': ('nasolabial_left', 'nasolabial_right'),
+}
+
+# Kernel and result keys per metric, for calculate_all_metrics
+_METRIC_KERNELS = {
+    'eyebrow': (_eyebrow_kernel,
+                ('left_span', 'right_span', 'inter_eyebrow', 'average_span')),
+    'mouth': (_mouth_kernel,
+              ('width', 'height', 'left_corner_droop', 'right_corner_droop', 'average_droop')),
+    'eye': (_eye_kernel,
+            ('left_aperture', 'right_aperture', 'average_aperture', 'asymmetry')),
+    'jaw': (_jaw_kernel,
+            ('left_tension', 'right_tension', 'width', 'average_tension')),
+    'nasolabial': (_nasolabial_kernel,
+                   ('left_depth', 'right_depth', 'average_depth', 'asymmetry')),
+}
+
+
+class PainLandmarks(NamedTuple):
+    """Pain indicator landmark groups, each a view into one gathered array"""
+    eyebrow_left: np.ndarray
+    eyebrow_right: np.ndarray
+    mouth_corners: np.ndarray
+    mouth_center: np.ndarray
+    eye_left: np.ndarray
+    eye_right: np.ndarray
+    jaw_left: np.ndarray
+    jaw_right: np.ndarray
+    nasolabial_left: np.ndarray
+    nasolabial_right: np.ndarray
+
+
+# Slices into landmarks[LANDMARK_FLAT], in PainLandmarks field order
+_PAIN_SLICES = tuple(LANDMARK_SLICES[name] for name in PainLandmarks._fields)
 
 
 class LandmarkExtractor:
     """
     Extract and process specific facial landmarks for pain analysis
+    
+    The get_* methods also accept a batch of frames, shape (N, 468, 3);
+    groups then come back with the leading batch axis.
     """
     
     def __init__(self):
         """Initialize landmark extractor with predefined indices"""
         self.landmark_indices = LANDMARK_INDICES
+        
+        # Index arrays built once so each getter is a single gather
+        self._idx = {
+            name: np.asarray(indices, dtype=np.intp)
+            for name, indices in LANDMARK_INDICES.items()
+        }
+        
+        # One gather per calculate_* metric, feeding its kernel
+        self._metric_idx = {
+            metric: np.concatenate([self._idx[name] for name in groups])
+            for metric, groups in _METRIC_GROUPS.items()
+        }
+        
+        # All metrics' rows in one index array, sliced back out per metric
+        self._all_metric_idx = np.concatenate(list(self._metric_idx.values()))
+        bounds = np.cumsum([0] + [len(idx) for idx in self._metric_idx.values()])
+        self._all_metric_slices = {
+            metric: slice(start, stop)
+            for metric, start, stop in zip(self._metric_idx, bounds[:-1], bounds[1:])
+        }
+        
+        # Compile the kernels now rather than on the first frame
+        dummy = np.zeros((468, 3), dtype=np.float32)
+        self.calculate_eyebrow_distance(dummy)
+        self.calculate_mouth_metrics(dummy)
+        self.calculate_eye_aperture(dummy)
+        self.calculate_jaw_tension(dummy)
+        self.calculate_nasolabial_depth(dummy)
     
     def get_eyebrow_landmarks(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
         """
@@ -34,8 +156,8 @@ class LandmarkExtractor:
             Dict with 'left' and 'right' eyebrow landmarks
         """
         return {
-            'left': landmarks[self.landmark_indices['eyebrow_left']],
-            'right': landmarks[self.landmark_indices['eyebrow_right']]
+            'left': landmarks[..., self._idx['eyebrow_left'], :],
+            'right': landmarks[..., self._idx['eyebrow_right'], :]
         }
     
     def get_mouth_landmarks(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
@@ -49,8 +171,8 @@ class LandmarkExtractor:
             Dict with 'corners' and 'center' mouth landmarks
         """
         return {
-            'corners': landmarks[self.landmark_indices['mouth_corners']],
-            'center': landmarks[self.landmark_indices['mouth_center']]
+            'corners': landmarks[..., self._idx['mouth_corners'], :],
+            'center': landmarks[..., self._idx['mouth_center'], :]
         }
     
     def get_eye_landmarks(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
@@ -64,8 +186,8 @@ class LandmarkExtractor:
             Dict with 'left' and 'right' eye landmarks
         """
         return {
-            'left': landmarks[self.landmark_indices['eye_left']],
-            'right': landmarks[self.landmark_indices['eye_right']]
+            'left': landmarks[..., self._idx['eye_left'], :],
+            'right': landmarks[..., self._idx['eye_right'], :]
         }
     
     def get_jaw_landmarks(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
@@ -79,8 +201,8 @@ class LandmarkExtractor:
             Dict with 'left' and 'right' jaw landmarks
         """
         return {
-            'left': landmarks[self.landmark_indices['jaw_left']],
-            'right': landmarks[self.landmark_indices['jaw_right']]
+            'left': landmarks[..., self._idx['jaw_left'], :],
+            'right': landmarks[..., self._idx['jaw_right'], :]
         }
     
     def get_nasolabial_landmarks(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
@@ -94,11 +216,11 @@ class LandmarkExtractor:
             Dict with 'left' and 'right' nasolabial landmarks
         """
         return {
-            'left': landmarks[self.landmark_indices['nasolabial_left']],
-            'right': landmarks[self.landmark_indices['nasolabial_right']]
+            'left': landmarks[..., self._idx['nasolabial_left'], :],
+            'right': landmarks[..., self._idx['nasolabial_right'], :]
         }
     
-    def get_all_pain_landmarks(self, landmarks: np.ndarray) -> Dict[str, Dict]:
+    def get_all_pain_landmarks(self, landmarks: np.ndarray) -> PainLandmarks:
         """
         Extract all pain-related landmarks
         
@@ -106,15 +228,12 @@ class LandmarkExtractor:
             landmarks: Full landmark array (468, 3)
         
         Returns:
-            Dict containing all pain indicator landmarks
+            PainLandmarks: One field per landmark group (e.g. .eyebrow_left),
+                           all views into a single gathered array
         """
-        return {
-            'eyebrows': self.get_eyebrow_landmarks(landmarks),
-            'mouth': self.get_mouth_landmarks(landmarks),
-            'eyes': self.get_eye_landmarks(landmarks),
-            'jaw': self.get_jaw_landmarks(landmarks),
-            'nasolabial': self.get_nasolabial_landmarks(landmarks)
-        }
+        # One gather for every group, then slice views per group
+        pts = landmarks[..., LANDMARK_FLAT, :]
+        return PainLandmarks._make([pts[..., s, :] for s in _PAIN_SLICES])
     
     def calculate_eyebrow_distance(self, landmarks: np.ndarray) -> Dict[str, float]:
         """
@@ -126,19 +245,15 @@ class LandmarkExtractor:
         Returns:
             Dict with distance measurements
         """
-        eyebrows = self.get_eyebrow_landmarks(landmarks)
-        
-        left_distance = calculate_distance(eyebrows['left'][0], eyebrows['left'][1])
-        right_distance = calculate_distance(eyebrows['right'][0], eyebrows['right'][1])
-        
-        # Distance between eyebrows (inner points)
-        inter_eyebrow = calculate_distance(eyebrows['left'][1], eyebrows['right'][1])
+        left_span, right_span, inter_eyebrow, average_span = _eyebrow_kernel(
+            landmarks[self._metric_idx['eyebrow']]
+        )
         
         return {
-            'left_span': left_distance,
-            'right_span': right_distance,
+            'left_span': left_span,
+            'right_span': right_span,
             'inter_eyebrow': inter_eyebrow,
-            'average_span': (left_distance + right_distance) / 2
+            'average_span': average_span
         }
     
     def calculate_mouth_metrics(self, landmarks: np.ndarray) -> Dict[str, float]:
@@ -151,27 +266,17 @@ class LandmarkExtractor:
         Returns:
             Dict with mouth measurements
         """
-        mouth = self.get_mouth_landmarks(landmarks)
-        
-        # Distance between mouth corners
-        corner_distance = calculate_distance(mouth['corners'][0], mouth['corners'][1])
-        
-        # Vertical mouth opening
-        vertical_opening = calculate_distance(mouth['center'][0], mouth['center'][1])
-        
-        # Calculate mouth angle (corners relative to center)
-        center_point = calculate_center(mouth['center'])
-        
-        # Check if corners are drooping (below center)
-        left_droop = mouth['corners'][0][1] - center_point[1]
-        right_droop = mouth['corners'][1][1] - center_point[1]
+        # Corners below the center point indicate drooping
+        width, height, left_droop, right_droop, average_droop = _mouth_kernel(
+            landmarks[self._metric_idx['mouth']]
+        )
         
         return {
-            'width': corner_distance,
-            'height': vertical_opening,
+            'width': width,
+            'height': height,
             'left_corner_droop': left_droop,
             'right_corner_droop': right_droop,
-            'average_droop': (left_droop + right_droop) / 2
+            'average_droop': average_droop
         }
     
     def calculate_eye_aperture(self, landmarks: np.ndarray) -> Dict[str, float]:
@@ -184,17 +289,16 @@ class LandmarkExtractor:
         Returns:
             Dict with eye aperture measurements
         """
-        eyes = self.get_eye_landmarks(landmarks)
-        
         # Vertical eye opening (distance between upper and lower eyelid)
-        left_aperture = calculate_distance(eyes['left'][0], eyes['left'][1])
-        right_aperture = calculate_distance(eyes['right'][0], eyes['right'][1])
+        left_aperture, right_aperture, average_aperture, asymmetry = _eye_kernel(
+            landmarks[self._metric_idx['eye']]
+        )
         
         return {
             'left_aperture': left_aperture,
             'right_aperture': right_aperture,
-            'average_aperture': (left_aperture + right_aperture) / 2,
-            'asymmetry': abs(left_aperture - right_aperture)
+            'average_aperture': average_aperture,
+            'asymmetry': asymmetry
         }
     
     def calculate_jaw_tension(self, landmarks: np.ndarray) -> Dict[str, float]:
@@ -207,20 +311,15 @@ class LandmarkExtractor:
         Returns:
             Dict with jaw measurements
         """
-        jaw = self.get_jaw_landmarks(landmarks)
-        
-        # Distance between jaw landmarks
-        left_jaw_distance = calculate_distance(jaw['left'][0], jaw['left'][1])
-        right_jaw_distance = calculate_distance(jaw['right'][0], jaw['right'][1])
-        
-        # Width of jaw
-        jaw_width = calculate_distance(jaw['left'][0], jaw['right'][0])
+        left_tension, right_tension, jaw_width, average_tension = _jaw_kernel(
+            landmarks[self._metric_idx['jaw']]
+        )
         
         return {
-            'left_tension': left_jaw_distance,
-            'right_tension': right_jaw_distance,
+            'left_tension': left_tension,
+            'right_tension': right_tension,
             'width': jaw_width,
-            'average_tension': (left_jaw_distance + right_jaw_distance) / 2
+            'average_tension': average_tension
         }
     
     def calculate_nasolabial_depth(self, landmarks: np.ndarray) -> Dict[str, float]:
@@ -233,17 +332,34 @@ class LandmarkExtractor:
         Returns:
             Dict with nasolabial measurements
         """
-        nasolabial = self.get_nasolabial_landmarks(landmarks)
-        
         # Use z-depth as indicator of fold depth
-        left_depth = nasolabial['left'][0][2]
-        right_depth = nasolabial['right'][0][2]
+        left_depth, right_depth, average_depth, asymmetry = _nasolabial_kernel(
+            landmarks[self._metric_idx['nasolabial']]
+        )
         
         return {
             'left_depth': float(left_depth),
             'right_depth': float(right_depth),
-            'average_depth': float((left_depth + right_depth) / 2),
-            'asymmetry': float(abs(left_depth - right_depth))
+            'average_depth': float(average_depth),
+            'asymmetry': float(asymmetry)
+        }
+    
+    def calculate_all_metrics(self, landmarks: np.ndarray) -> Dict[str, Dict[str, float]]:
+        """
+        Calculate every calculate_* metric from a single gather
+        
+        Args:
+            landmarks: Full landmark array (468, 3)
+        
+        Returns:
+            Dict keyed by 'eyebrow', 'mouth', 'eye', 'jaw' and 'nasolabial',
+            each holding the dict its calculate_* method returns
+        """
+        pts = landmarks[self._all_metric_idx]
+        
+        return {
+            metric: dict(zip(keys, kernel(pts[self._all_metric_slices[metric]])))
+            for metric, (kernel, keys) in _METRIC_KERNELS.items()
         }
     
     def get_landmark_positions(self, landmarks: np.ndarray, indices: List[int]) -> np.ndarray:
@@ -272,9 +388,8 @@ class LandmarkExtractor:
             float: Normalized value
         """
         # Use eye distance as reference for face size
-        left_eye = landmarks[33]
-        right_eye = landmarks[263]
-        eye_distance = calculate_distance(left_eye, right_eye)
+        (lx, ly, lz), (rx, ry, rz) = landmarks[[33, 263]].tolist()
+        eye_distance = dist3(lx, ly, lz, rx, ry, rz)
         
         # Avoid division by zero
         if eye_distance < 0.001:
@@ -8,11 +8,13 @@ from .grimace_analyzer import GrimaceAnalyzer
 from .eye_analyzer import EyeAnalyzer
 from .jaw_analyzer import JawAnalyzer
 from .nasolabial_analyzer import NasolabialAnalyzer
+from .landmark_view import LandmarkView
 
 __all__ = [
     'BrowAnalyzer',
     'GrimaceAnalyzer',
     'EyeAnalyzer',
     'JawAnalyzer',
-    'NasolabialAnalyzer'
+    'NasolabialAnalyzer',
+    'LandmarkView'
 ]
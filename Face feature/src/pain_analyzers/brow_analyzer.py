@@ -5,12 +5,9 @@ Analyzes eyebrow position and furrowing to detect pain indicators
 
 import numpy as np
 from typing import Dict, Tuple
-import sys
-from pathlib import Path
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
-from utils import calculate_distance, calculate_angle
+from ..utils import dist3, angle3, angles_batch, RingBuffer
+from .kernels import brow_score
 
 
 class BrowAnalyzer:
@@ -23,96 +20,126 @@ class BrowAnalyzer:
         Args:
             landmark_indices: Dictionary containing landmark indices for eyebrows
         """
-        self.eyebrow_left = landmark_indices.get('eyebrow_left', [70, 107])
-        self.eyebrow_right = landmark_indices.get('eyebrow_right', [336, 300])
+        # Index arrays (not lists) so each gather skips the list->intp conversion
+        self.eyebrow_left = np.asarray(landmark_indices.get('eyebrow_left', [70, 107]), dtype=np.intp)
+        self.eyebrow_right = np.asarray(landmark_indices.get('eyebrow_right', [336, 300]), dtype=np.intp)
+        self.nose_bridge = 168
+        
+        # Index arrays read each frame, by name (LandmarkView remaps these onto
+        # its gathered buffer)
+        self.landmark_offsets = {
+            'eyebrow_left': self.eyebrow_left,
+            'eyebrow_right': self.eyebrow_right,
+            'nose_bridge': np.intp(self.nose_bridge),
+        }
         
         # Baseline values (set during calibration)
         self.baseline_distance_left = None
         self.baseline_distance_right = None
         self.baseline_angle = None
         
+        # Weight of each relative change in the batched score
+        self._baseline_weights = np.full(3, 1.0 / 3.0)
+        
         # Historical data for smoothing
-        self.history = []
         self.history_size = 5  # Reduced from 10 for faster response
+        self.history = RingBuffer(self.history_size)
+        
+        # Recency weights for each possible history length
+        self._smoothing_weights = [np.linspace(0.5, 1.0, n) for n in range(self.history_size + 1)]
+        self._smoothing_sums = [float(w.sum()) for w in self._smoothing_weights]
+        
+        # Compile the scoring kernel up front so the first frame is not slow
+        brow_score(0.1, 0.1, 90.0, 0.1, 0.1, 90.0, False)
     
-    def set_baseline(self, landmarks: np.ndarray):
+    def set_baseline(self, landmarks: np.ndarray, offsets: Dict[str, np.ndarray] = None):
         """
         Set baseline measurements from neutral expression
         
         Args:
             landmarks: Facial landmarks array (468, 3)
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         """
-        left_points = landmarks[self.eyebrow_left]
-        right_points = landmarks[self.eyebrow_right]
+        idx = offsets or self.landmark_offsets
         
-        # Calculate baseline distances
-        self.baseline_distance_left = calculate_distance(left_points[0], left_points[1])
-        self.baseline_distance_right = calculate_distance(right_points[0], right_points[1])
+        # Calculate baseline distances and angle between eyebrows
+        (self.baseline_distance_left,
+         self.baseline_distance_right,
+         self.baseline_angle) = self._measure(landmarks, idx)
+    
+    @property
+    def _baseline_args(self) -> tuple:
+        """Baseline in score kernel argument order, read from the baseline_* attributes"""
+        if not self._has_baseline:
+            return (0.0, 0.0, 0.0)
+        return (self.baseline_distance_left,
+                self.baseline_distance_right,
+                self.baseline_angle)
+    
+    @property
+    def _has_baseline(self) -> bool:
+        """Whether a baseline is set (set_baseline or assigning the baseline_* attributes)"""
+        return self.baseline_distance_left is not None
+    
+    def _measure(self, landmarks: np.ndarray, idx: Dict[str, np.ndarray]) -> Tuple[float, float, float]:
+        """
+        Eyebrow spans and the angle between eyebrow centers at the nose bridge
         
-        # Calculate baseline angle between eyebrows
-        center_left = np.mean(left_points, axis=0)
-        center_right = np.mean(right_points, axis=0)
-        nose_bridge = landmarks[168]  # Nose bridge point
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+            idx: Index arrays to read with (see landmark_offsets)
+        
+        Returns:
+            Tuple of (left_distance, right_distance, angle in degrees)
+        """
+        (l0x, l0y, l0z), (l1x, l1y, l1z) = landmarks[idx['eyebrow_left']].tolist()
+        (r0x, r0y, r0z), (r1x, r1y, r1z) = landmarks[idx['eyebrow_right']].tolist()
+        nx, ny, nz = landmarks[idx['nose_bridge']].tolist()  # Nose bridge point
         
-        self.baseline_angle = calculate_angle(center_left, nose_bridge, center_right)
+        distance_left = dist3(l0x, l0y, l0z, l1x, l1y, l1z)
+        distance_right = dist3(r0x, r0y, r0z, r1x, r1y, r1z)
+        
+        # Angle between eyebrow centers, with the nose bridge as vertex
+        angle = angle3((l0x + l1x) / 2, (l0y + l1y) / 2, (l0z + l1z) / 2,
+                       nx, ny, nz,
+                       (r0x + r1x) / 2, (r0y + r1y) / 2, (r0z + r1z) / 2)
+        
+        return distance_left, distance_right, angle
     
-    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, float]:
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True,
+                offsets: Dict[str, np.ndarray] = None) -> Dict[str, float]:
         """
         Analyze brow tension from landmarks
         
         Args:
             landmarks: Facial landmarks array (468, 3)
             use_baseline: Whether to use baseline comparison
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         
         Returns:
             Dict containing analysis results
         """
-        left_points = landmarks[self.eyebrow_left]
-        right_points = landmarks[self.eyebrow_right]
-        
-        # Calculate current distances
-        current_distance_left = calculate_distance(left_points[0], left_points[1])
-        current_distance_right = calculate_distance(right_points[0], right_points[1])
-        
-        # Calculate current angle
-        center_left = np.mean(left_points, axis=0)
-        center_right = np.mean(right_points, axis=0)
-        nose_bridge = landmarks[168]
-        current_angle = calculate_angle(center_left, nose_bridge, center_right)
-        
-        # Calculate tension score
-        if use_baseline and self.baseline_distance_left is not None:
-            # Compare to baseline
-            left_change = abs(current_distance_left - self.baseline_distance_left) / self.baseline_distance_left
-            right_change = abs(current_distance_right - self.baseline_distance_right) / self.baseline_distance_right
-            angle_change = abs(current_angle - self.baseline_angle) / self.baseline_angle
-            
-            # Furrowed brows typically move closer together and downward
-            tension_score = (left_change + right_change + angle_change) / 3.0
-        else:
-            # Use absolute measurements
-            # Lower angle typically indicates more tension
-            angle_factor = 1.0 - (current_angle / 180.0)  # Normalize to 0-1
-            
-            # Closer eyebrows indicate tension
-            avg_distance = (current_distance_left + current_distance_right) / 2.0
-            distance_factor = 1.0 - min(avg_distance * 10, 1.0)  # Scale and cap at 1
-            
-            tension_score = (angle_factor * 0.6 + distance_factor * 0.4)
-        
-        # Normalize to 0-1 range and convert to percentage
-        tension_score = np.clip(tension_score * 3.5, 0.0, 1.0)  # Increased sensitivity from 2.0 to 3.5
+        idx = offsets or self.landmark_offsets
+        
+        # Calculate current distances and angle
+        current_distance_left, current_distance_right, current_angle = self._measure(landmarks, idx)
+        
+        # Calculate tension score (baseline terms are ignored without a baseline)
+        tension_score = brow_score(
+            current_distance_left, current_distance_right, current_angle,
+            *self._baseline_args, use_baseline and self._has_baseline)
         tension_percentage = tension_score * 100
         
         # Apply smoothing with less weight to make it more responsive
-        self.history.append(tension_score)
-        if len(self.history) > self.history_size:
-            self.history.pop(0)
+        self.history.push(tension_score)
         
         # Use weighted average favoring recent frames
-        if len(self.history) > 1:
-            weights = np.linspace(0.5, 1.0, len(self.history))
-            smoothed_score = np.average(self.history, weights=weights)
+        filled = len(self.history)
+        if filled > 1:
+            smoothed_score = self.history.weighted_mean(self._smoothing_weights[filled],
+                                                        self._smoothing_sums[filled])
         else:
             smoothed_score = tension_score
         smoothed_percentage = smoothed_score * 100
@@ -125,7 +152,62 @@ class BrowAnalyzer:
             'left_distance': current_distance_left,
             'right_distance': current_distance_right,
             'angle': current_angle,
-            'has_baseline': self.baseline_distance_left is not None
+            'has_baseline': self._has_baseline
+        }
+    
+    def analyze_batch(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Analyze brow tension for a sequence of frames at once
+        
+        Gives the same values as calling analyze() on each frame in order
+        (history included), with the geometry computed across the batch axis.
+        
+        Args:
+            landmarks: Facial landmarks for N frames, shape (N, 468, 3)
+            use_baseline: Whether to use baseline comparison
+        
+        Returns:
+            Dict of per-frame result arrays (length N), same keys as analyze()
+        """
+        # Gather in the input dtype (float32 from the detector) and widen only
+        # the gathered points to float64, matching analyze()
+        landmarks = np.asarray(landmarks)
+        left_points = landmarks[:, self.eyebrow_left].astype(np.float64)
+        right_points = landmarks[:, self.eyebrow_right].astype(np.float64)
+        nose_bridge = landmarks[:, self.nose_bridge].astype(np.float64)
+        
+        # Eyebrow spans
+        distance_left = np.linalg.norm(left_points[:, 0] - left_points[:, 1], axis=-1)
+        distance_right = np.linalg.norm(right_points[:, 0] - right_points[:, 1], axis=-1)
+        
+        # Angle between eyebrow centers, with the nose bridge as vertex
+        angle = angles_batch((left_points[:, 0] + left_points[:, 1]) / 2, nose_bridge,
+                             (right_points[:, 0] + right_points[:, 1]) / 2)
+        
+        if use_baseline and self._has_baseline:
+            # Relative change of each measurement (multiplying by the
+            # reciprocal baseline), weighted in one matmul
+            current = np.stack((distance_left, distance_right, angle), axis=-1)
+            baseline = np.array(self._baseline_args)
+            tension_score = (np.abs(current - baseline) * (1.0 / baseline)) @ self._baseline_weights
+        else:
+            angle_factor = 1.0 - (angle / 180.0)
+            avg_distance = (distance_left + distance_right) / 2.0
+            distance_factor = 1.0 - np.minimum(avg_distance * 10, 1.0)
+            tension_score = angle_factor * 0.6 + distance_factor * 0.4
+        
+        tension_score = np.clip(tension_score * 3.5, 0.0, 1.0)
+        smoothed_score = self.history.push_smoothed(tension_score, self._smoothing_weights)
+        
+        return {
+            'tension_score': tension_score,
+            'tension_percentage': tension_score * 100,
+            'smoothed_score': smoothed_score,
+            'smoothed_percentage': smoothed_score * 100,
+            'left_distance': distance_left,
+            'right_distance': distance_right,
+            'angle': angle,
+            'has_baseline': self._has_baseline
         }
     
     def get_description(self, score: float) -> str:
@@ -153,4 +235,4 @@ class BrowAnalyzer:
     
     def reset_history(self):
         """Clear historical data"""
-        self.history = []
+        self.history.clear()
@@ -5,11 +5,9 @@ Analyzes eye aperture and squinting patterns
 
 import numpy as np
 from typing import Dict, Tuple
-import sys
-from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
-from utils import calculate_distance
+from ..utils import pair_distances, RingBuffer
+from .kernels import eye_score
 
 
 class EyeAnalyzer:
@@ -22,8 +20,8 @@ class EyeAnalyzer:
         Args:
             landmark_indices: Dictionary containing landmark indices for eyes
         """
-        self.eye_left = landmark_indices.get('eye_left', [159, 145])
-        self.eye_right = landmark_indices.get('eye_right', [386, 374])
+        self.eye_left = np.asarray(landmark_indices.get('eye_left', [159, 145]), dtype=np.intp)
+        self.eye_right = np.asarray(landmark_indices.get('eye_right', [386, 374]), dtype=np.intp)
         
         # Additional eye landmarks for better analysis
         self.left_upper = 159
@@ -37,6 +35,17 @@ class EyeAnalyzer:
         self.right_inner = 362
         self.right_outer = 263
         
+        # Pairs measured each frame, gathered in one go:
+        # left/right aperture (upper-lower), left/right width (inner-outer)
+        self._pair_idx_a = np.array([self.left_upper, self.right_upper,
+                                     self.left_inner, self.right_inner], dtype=np.intp)
+        self._pair_idx_b = np.array([self.left_lower, self.right_lower,
+                                     self.left_outer, self.right_outer], dtype=np.intp)
+        
+        # Index arrays read each frame, by name (LandmarkView remaps these onto
+        # its gathered buffer)
+        self.landmark_offsets = {'pair_a': self._pair_idx_a, 'pair_b': self._pair_idx_b}
+        
         # Baseline values
         self.baseline_left_aperture = None
         self.baseline_right_aperture = None
@@ -44,106 +53,94 @@ class EyeAnalyzer:
         self.baseline_right_width = None
         
         # Historical data
-        self.history = []
         self.history_size = 5  # Reduced from 10 for faster response
+        self.history = RingBuffer(self.history_size)
+        
+        # Recency weights for each possible history length
+        self._smoothing_weights = [np.linspace(0.5, 1.0, n) for n in range(self.history_size + 1)]
+        self._smoothing_sums = [float(w.sum()) for w in self._smoothing_weights]
+        
+        # Compile the scoring kernel up front so the first frame is not slow
+        eye_score(0.1, 0.1, 0.3, 0.3, 0.1, 0.1, 0.3, 0.3, False)
     
-    def set_baseline(self, landmarks: np.ndarray):
+    def set_baseline(self, landmarks: np.ndarray, offsets: Dict[str, np.ndarray] = None):
         """
         Set baseline measurements from neutral expression
         
         Args:
             landmarks: Facial landmarks array (468, 3)
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
+        """
+        idx = offsets or self.landmark_offsets
+        
+        # Vertical aperture (eye height) and horizontal width
+        (self.baseline_left_aperture, self.baseline_right_aperture,
+         self.baseline_left_width, self.baseline_right_width) = self._measure(landmarks, idx)
+    
+    @property
+    def _baseline_args(self) -> tuple:
+        """Baseline in score kernel argument order, read from the baseline_* attributes"""
+        if not self._has_baseline:
+            return (0.0, 0.0, 0.0, 0.0)
+        return (self.baseline_left_aperture,
+                self.baseline_right_aperture,
+                self.baseline_left_width,
+                self.baseline_right_width)
+    
+    @property
+    def _has_baseline(self) -> bool:
+        """Whether a baseline is set (set_baseline or assigning the baseline_* attributes)"""
+        return self.baseline_left_aperture is not None
+    
+    def _measure(self, landmarks: np.ndarray, idx: Dict[str, np.ndarray]) -> Tuple[float, float, float, float]:
+        """
+        Eye apertures and widths from one vectorized distance call
+        
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+            idx: Index arrays to read with (see landmark_offsets)
+        
+        Returns:
+            Tuple of (left_aperture, right_aperture, left_width, right_width)
         """
-        # Vertical aperture (eye height)
-        left_upper = landmarks[self.left_upper]
-        left_lower = landmarks[self.left_lower]
-        right_upper = landmarks[self.right_upper]
-        right_lower = landmarks[self.right_lower]
-        
-        self.baseline_left_aperture = calculate_distance(left_upper, left_lower)
-        self.baseline_right_aperture = calculate_distance(right_upper, right_lower)
-        
-        # Horizontal width
-        left_inner = landmarks[self.left_inner]
-        left_outer = landmarks[self.left_outer]
-        right_inner = landmarks[self.right_inner]
-        right_outer = landmarks[self.right_outer]
-        
-        self.baseline_left_width = calculate_distance(left_inner, left_outer)
-        self.baseline_right_width = calculate_distance(right_inner, right_outer)
+        return tuple(pair_distances(landmarks, idx['pair_a'], idx['pair_b']).tolist())
     
-    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, float]:
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True,
+                offsets: Dict[str, np.ndarray] = None) -> Dict[str, float]:
         """
         Analyze eye squinting from landmarks
         
         Args:
             landmarks: Facial landmarks array (468, 3)
             use_baseline: Whether to use baseline comparison
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         
         Returns:
             Dict containing analysis results
         """
-        # Get current measurements
-        left_upper = landmarks[self.left_upper]
-        left_lower = landmarks[self.left_lower]
-        right_upper = landmarks[self.right_upper]
-        right_lower = landmarks[self.right_lower]
-        
-        current_left_aperture = calculate_distance(left_upper, left_lower)
-        current_right_aperture = calculate_distance(right_upper, right_lower)
-        
-        # Horizontal width
-        left_inner = landmarks[self.left_inner]
-        left_outer = landmarks[self.left_outer]
-        right_inner = landmarks[self.right_inner]
-        right_outer = landmarks[self.right_outer]
-        
-        current_left_width = calculate_distance(left_inner, left_outer)
-        current_right_width = calculate_distance(right_inner, right_outer)
-        
-        # Calculate aspect ratio (height/width) for each eye
-        left_aspect_ratio = current_left_aperture / current_left_width if current_left_width > 0 else 0
-        right_aspect_ratio = current_right_aperture / current_right_width if current_right_width > 0 else 0
-        
-        # Calculate squint score
-        if use_baseline and self.baseline_left_aperture is not None:
-            # Squinting causes reduced aperture
-            left_reduction = 1.0 - (current_left_aperture / self.baseline_left_aperture)
-            right_reduction = 1.0 - (current_right_aperture / self.baseline_right_aperture)
-            
-            # Width might also decrease slightly
-            left_width_change = abs(current_left_width - self.baseline_left_width) / self.baseline_left_width
-            right_width_change = abs(current_right_width - self.baseline_right_width) / self.baseline_right_width
-            
-            squint_score = (
-                (left_reduction + right_reduction) * 0.7 +
-                (left_width_change + right_width_change) * 0.3
-            ) / 2.0
-        else:
-            # Use absolute measurements
-            # Lower aspect ratio indicates squinting
-            avg_aspect_ratio = (left_aspect_ratio + right_aspect_ratio) / 2.0
-            
-            # Normal eye aspect ratio is around 0.25-0.35
-            # Squinting reduces it to 0.15-0.20
-            normal_ratio = 0.30
-            squint_factor = max(0, normal_ratio - avg_aspect_ratio) / normal_ratio
-            
-            squint_score = squint_factor
-        
-        # Normalize and convert to percentage
-        squint_score = np.clip(squint_score * 3.5, 0.0, 1.0)  # Increased sensitivity from 2.0 to 3.5
+        idx = offsets or self.landmark_offsets
+        
+        # Get current measurements (apertures and horizontal widths)
+        (current_left_aperture, current_right_aperture,
+         current_left_width, current_right_width) = self._measure(landmarks, idx)
+        
+        # Calculate squint score and aspect ratio (height/width) for each eye
+        squint_score, left_aspect_ratio, right_aspect_ratio = eye_score(
+            current_left_aperture, current_right_aperture,
+            current_left_width, current_right_width,
+            *self._baseline_args, use_baseline and self._has_baseline)
         squint_percentage = squint_score * 100
         
         # Apply smoothing with less weight to make it more responsive
-        self.history.append(squint_score)
-        if len(self.history) > self.history_size:
-            self.history.pop(0)
+        self.history.push(squint_score)
         
         # Use weighted average favoring recent frames
-        if len(self.history) > 1:
-            weights = np.linspace(0.5, 1.0, len(self.history))
-            smoothed_score = np.average(self.history, weights=weights)
+        filled = len(self.history)
+        if filled > 1:
+            smoothed_score = self.history.weighted_mean(self._smoothing_weights[filled],
+                                                        self._smoothing_sums[filled])
         else:
             smoothed_score = squint_score
         smoothed_percentage = smoothed_score * 100
@@ -157,7 +154,7 @@ class EyeAnalyzer:
             'right_aperture': current_right_aperture,
             'left_aspect_ratio': left_aspect_ratio,
             'right_aspect_ratio': right_aspect_ratio,
-            'has_baseline': self.baseline_left_aperture is not None
+            'has_baseline': self._has_baseline
         }
     
     def get_description(self, score: float) -> str:
@@ -185,4 +182,4 @@ class EyeAnalyzer:
     
     def reset_history(self):
         """Clear historical data"""
-        self.history = []
+        self.history.clear()
@@ -5,11 +5,9 @@ Analyzes mouth and lip tension to detect grimacing patterns
 
 import numpy as np
 from typing import Dict, Tuple
-import sys
-from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
-from utils import calculate_distance, calculate_angle
+from ..utils import pair_distances, RingBuffer
+from .kernels import grimace_score as score_grimace
 
 
 class GrimaceAnalyzer:
@@ -22,109 +20,115 @@ class GrimaceAnalyzer:
         Args:
             landmark_indices: Dictionary containing landmark indices for mouth
         """
-        self.mouth_corners = landmark_indices.get('mouth_corners', [61, 291])
-        self.mouth_center = landmark_indices.get('mouth_center', [0, 17])
+        self.mouth_corners = np.asarray(landmark_indices.get('mouth_corners', [61, 291]), dtype=np.intp)
+        self.mouth_center = np.asarray(landmark_indices.get('mouth_center', [0, 17]), dtype=np.intp)
         
         # Additional mouth landmarks for better analysis
         self.upper_lip = [13, 14]  # Upper lip center
         self.lower_lip = [78, 308]  # Lower lip corners
         
+        # Pairs measured each frame, gathered in one go:
+        # corner-corner, top-bottom center, upper-lower lip
+        self._pair_idx_a = np.array([self.mouth_corners[0], self.mouth_center[0],
+                                     self.upper_lip[0]], dtype=np.intp)
+        self._pair_idx_b = np.array([self.mouth_corners[1], self.mouth_center[1],
+                                     self.lower_lip[0]], dtype=np.intp)
+        
+        # Index arrays read each frame, by name (LandmarkView remaps these onto
+        # its gathered buffer)
+        self.landmark_offsets = {'pair_a': self._pair_idx_a, 'pair_b': self._pair_idx_b}
+        
         # Baseline values
         self.baseline_corner_distance = None
         self.baseline_vertical_distance = None
         self.baseline_lip_distance = None
         
         # Historical data
-        self.history = []
         self.history_size = 5  # Reduced from 10 for faster response
+        self.history = RingBuffer(self.history_size)
+        
+        # Recency weights for each possible history length
+        self._smoothing_weights = [np.linspace(0.5, 1.0, n) for n in range(self.history_size + 1)]
+        self._smoothing_sums = [float(w.sum()) for w in self._smoothing_weights]
+        
+        # Compile the scoring kernel up front so the first frame is not slow
+        score_grimace(0.1, 0.1, 0.1, 0.0, 0.1, 0.1, 0.1, False)
     
-    def set_baseline(self, landmarks: np.ndarray):
+    def set_baseline(self, landmarks: np.ndarray, offsets: Dict[str, np.ndarray] = None):
         """
         Set baseline measurements from neutral expression
         
         Args:
             landmarks: Facial landmarks array (468, 3)
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         """
-        left_corner = landmarks[self.mouth_corners[0]]
-        right_corner = landmarks[self.mouth_corners[1]]
-        top_center = landmarks[self.mouth_center[0]]
-        bottom_center = landmarks[self.mouth_center[1]]
-        
-        # Horizontal distance between corners
-        self.baseline_corner_distance = calculate_distance(left_corner, right_corner)
+        idx = offsets or self.landmark_offsets
         
-        # Vertical distance (mouth opening)
-        self.baseline_vertical_distance = calculate_distance(top_center, bottom_center)
-        
-        # Lip tension
-        upper = landmarks[self.upper_lip[0]]
-        lower = landmarks[self.lower_lip[0]]
-        self.baseline_lip_distance = calculate_distance(upper, lower)
+        # Corner distance, vertical opening and lip tension
+        (self.baseline_corner_distance,
+         self.baseline_vertical_distance,
+         self.baseline_lip_distance) = pair_distances(
+            landmarks, idx['pair_a'], idx['pair_b']).tolist()
+    
+    @property
+    def _baseline_args(self) -> tuple:
+        """Baseline in score kernel argument order, read from the baseline_* attributes"""
+        if not self._has_baseline:
+            return (0.0, 0.0, 0.0)
+        return (self.baseline_corner_distance,
+                self.baseline_vertical_distance,
+                self.baseline_lip_distance)
     
-    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, float]:
+    @property
+    def _has_baseline(self) -> bool:
+        """Whether a baseline is set (set_baseline or assigning the baseline_* attributes)"""
+        return self.baseline_corner_distance is not None
+    
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True,
+                offsets: Dict[str, np.ndarray] = None) -> Dict[str, float]:
         """
         Analyze grimace intensity from landmarks
         
         Args:
             landmarks: Facial landmarks array (468, 3)
             use_baseline: Whether to use baseline comparison
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         
         Returns:
             Dict containing analysis results
         """
-        left_corner = landmarks[self.mouth_corners[0]]
-        right_corner = landmarks[self.mouth_corners[1]]
-        top_center = landmarks[self.mouth_center[0]]
-        bottom_center = landmarks[self.mouth_center[1]]
+        idx = offsets or self.landmark_offsets
         
-        # Calculate current measurements
-        current_corner_distance = calculate_distance(left_corner, right_corner)
-        current_vertical_distance = calculate_distance(top_center, bottom_center)
+        # Calculate current measurements (corners, vertical opening, lip tension)
+        (current_corner_distance,
+         current_vertical_distance,
+         current_lip_distance) = pair_distances(
+            landmarks, idx['pair_a'], idx['pair_b']).tolist()
         
         # Calculate mouth corner depression (y-coordinate comparison)
-        corner_midpoint_y = (left_corner[1] + right_corner[1]) / 2
-        center_y = (top_center[1] + bottom_center[1]) / 2
+        left_corner_y, top_center_y = landmarks[idx['pair_a'][:2], 1].tolist()
+        right_corner_y, bottom_center_y = landmarks[idx['pair_b'][:2], 1].tolist()
+        corner_midpoint_y = (left_corner_y + right_corner_y) / 2
+        center_y = (top_center_y + bottom_center_y) / 2
         corner_depression = max(0, corner_midpoint_y - center_y)
         
-        # Lip tension
-        upper = landmarks[self.upper_lip[0]]
-        lower = landmarks[self.lower_lip[0]]
-        current_lip_distance = calculate_distance(upper, lower)
-        
-        # Calculate grimace score
-        if use_baseline and self.baseline_corner_distance is not None:
-            # Grimacing typically involves:
-            # 1. Corners pulled down or tight
-            # 2. Reduced vertical opening
-            # 3. Increased lip tension
-            
-            corner_change = abs(current_corner_distance - self.baseline_corner_distance) / self.baseline_corner_distance
-            vertical_change = abs(current_vertical_distance - self.baseline_vertical_distance) / self.baseline_vertical_distance
-            lip_change = abs(current_lip_distance - self.baseline_lip_distance) / self.baseline_lip_distance
-            
-            grimace_score = (corner_change * 0.4 + vertical_change * 0.3 + lip_change * 0.3)
-        else:
-            # Use absolute measurements
-            # Tight mouth indicates grimacing
-            corner_factor = 1.0 - min(current_corner_distance * 5, 1.0)
-            vertical_factor = 1.0 - min(current_vertical_distance * 20, 1.0)
-            depression_factor = min(corner_depression * 50, 1.0)
-            
-            grimace_score = (corner_factor * 0.35 + vertical_factor * 0.35 + depression_factor * 0.30)
-        
-        # Normalize and convert to percentage
-        grimace_score = np.clip(grimace_score * 3.0, 0.0, 1.0)  # Increased sensitivity from 1.8 to 3.0
+        # Calculate grimace score (baseline terms are ignored without a baseline)
+        grimace_score = score_grimace(
+            current_corner_distance, current_vertical_distance,
+            current_lip_distance, corner_depression,
+            *self._baseline_args, use_baseline and self._has_baseline)
         grimace_percentage = grimace_score * 100
         
         # Apply smoothing with less weight to make it more responsive
-        self.history.append(grimace_score)
-        if len(self.history) > self.history_size:
-            self.history.pop(0)
+        self.history.push(grimace_score)
         
         # Use weighted average favoring recent frames
-        if len(self.history) > 1:
-            weights = np.linspace(0.5, 1.0, len(self.history))
-            smoothed_score = np.average(self.history, weights=weights)
+        filled = len(self.history)
+        if filled > 1:
+            smoothed_score = self.history.weighted_mean(self._smoothing_weights[filled],
+                                                        self._smoothing_sums[filled])
         else:
             smoothed_score = grimace_score
         smoothed_percentage = smoothed_score * 100
@@ -137,7 +141,7 @@ class GrimaceAnalyzer:
             'corner_distance': current_corner_distance,
             'vertical_distance': current_vertical_distance,
             'corner_depression': corner_depression,
-            'has_baseline': self.baseline_corner_distance is not None
+            'has_baseline': self._has_baseline
         }
     
     def get_description(self, score: float) -> str:
@@ -165,4 +169,4 @@ class GrimaceAnalyzer:
     
     def reset_history(self):
         """Clear historical data"""
-        self.history = []
+        self.history.clear()
@@ -5,11 +5,9 @@ Analyzes jaw tension and clenching patterns
 
 import numpy as np
 from typing import Dict, Tuple
-import sys
-from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
-from utils import calculate_distance, calculate_angle
+from ..utils import pair_distances, triplet_angles, RingBuffer
+from .kernels import jaw_score
 
 
 class JawAnalyzer:
@@ -22,14 +20,33 @@ class JawAnalyzer:
         Args:
             landmark_indices: Dictionary containing landmark indices for jaw
         """
-        self.jaw_left = landmark_indices.get('jaw_left', [234, 93])
-        self.jaw_right = landmark_indices.get('jaw_right', [454, 323])
+        self.jaw_left = np.asarray(landmark_indices.get('jaw_left', [234, 93]), dtype=np.intp)
+        self.jaw_right = np.asarray(landmark_indices.get('jaw_right', [454, 323]), dtype=np.intp)
         
         # Additional landmarks for comprehensive analysis
         self.jaw_bottom = 152  # Chin point
         self.jaw_left_angle = 172
         self.jaw_right_angle = 397
         
+        # Pairs measured each frame, gathered in one go: left/right jaw line,
+        # jaw width (angle-angle), left/right tension (jaw angle-cheek)
+        self._pair_idx_a = np.array([self.jaw_left[0], self.jaw_right[0], self.jaw_left_angle,
+                                     self.jaw_left_angle, self.jaw_right_angle], dtype=np.intp)
+        self._pair_idx_b = np.array([self.jaw_left[1], self.jaw_right[1], self.jaw_right_angle,
+                                     234, 454], dtype=np.intp)
+        
+        # Jaw angle at the chin
+        self._angle_idx = np.array([[self.jaw_left_angle, self.jaw_bottom, self.jaw_right_angle]],
+                                   dtype=np.intp)
+        
+        # Index arrays read each frame, by name (LandmarkView remaps these onto
+        # its gathered buffer)
+        self.landmark_offsets = {
+            'pair_a': self._pair_idx_a,
+            'pair_b': self._pair_idx_b,
+            'angle': self._angle_idx,
+        }
+        
         # Baseline values
         self.baseline_left_distance = None
         self.baseline_right_distance = None
@@ -37,107 +54,99 @@ class JawAnalyzer:
         self.baseline_jaw_angle = None
         
         # Historical data
-        self.history = []
         self.history_size = 5  # Reduced from 10 for faster response
+        self.history = RingBuffer(self.history_size)
+        
+        # Recency weights for each possible history length
+        self._smoothing_weights = [np.linspace(0.5, 1.0, n) for n in range(self.history_size + 1)]
+        self._smoothing_sums = [float(w.sum()) for w in self._smoothing_weights]
+        
+        # Compile the scoring kernel up front so the first frame is not slow
+        jaw_score(0.1, 0.1, 0.3, 90.0, 0.1, 0.1, 0.3, 90.0, False)
     
-    def set_baseline(self, landmarks: np.ndarray):
+    def set_baseline(self, landmarks: np.ndarray, offsets: Dict[str, np.ndarray] = None):
         """
         Set baseline measurements from neutral expression
         
         Args:
             landmarks: Facial landmarks array (468, 3)
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         """
-        left_points = landmarks[self.jaw_left]
-        right_points = landmarks[self.jaw_right]
-        jaw_bottom = landmarks[self.jaw_bottom]
+        idx = offsets or self.landmark_offsets
         
-        # Distance along jaw line
-        self.baseline_left_distance = calculate_distance(left_points[0], left_points[1])
-        self.baseline_right_distance = calculate_distance(right_points[0], right_points[1])
+        # Distance along jaw line, jaw width and jaw angle (relaxed vs clenched)
+        (self.baseline_left_distance, self.baseline_right_distance,
+         self.baseline_jaw_width, _, _, self.baseline_jaw_angle) = self._measure(landmarks, idx)
+    
+    @property
+    def _baseline_args(self) -> tuple:
+        """Baseline in score kernel argument order, read from the baseline_* attributes"""
+        if not self._has_baseline:
+            return (0.0, 0.0, 0.0, 0.0)
+        return (self.baseline_left_distance,
+                self.baseline_right_distance,
+                self.baseline_jaw_width,
+                self.baseline_jaw_angle)
+    
+    @property
+    def _has_baseline(self) -> bool:
+        """Whether a baseline is set (set_baseline or assigning the baseline_* attributes)"""
+        return self.baseline_left_distance is not None
+    
+    def _measure(self, landmarks: np.ndarray, idx: Dict[str, np.ndarray]) -> Tuple[float, ...]:
+        """
+        All jaw distances and the jaw angle from two vectorized calls
         
-        # Jaw width
-        left_angle = landmarks[self.jaw_left_angle]
-        right_angle = landmarks[self.jaw_right_angle]
-        self.baseline_jaw_width = calculate_distance(left_angle, right_angle)
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+            idx: Index arrays to read with (see landmark_offsets)
         
-        # Jaw angle (relaxed vs clenched)
-        self.baseline_jaw_angle = calculate_angle(left_angle, jaw_bottom, right_angle)
+        Returns:
+            Tuple of (left_distance, right_distance, jaw_width,
+                      left_tension_distance, right_tension_distance, jaw_angle)
+        """
+        distances = pair_distances(landmarks, idx['pair_a'], idx['pair_b']).tolist()
+        angle = triplet_angles(landmarks, idx['angle']).item()
+        return (*distances, angle)
     
-    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, float]:
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True,
+                offsets: Dict[str, np.ndarray] = None) -> Dict[str, float]:
         """
         Analyze jaw clenching from landmarks
         
         Args:
             landmarks: Facial landmarks array (468, 3)
             use_baseline: Whether to use baseline comparison
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         
         Returns:
             Dict containing analysis results
         """
-        left_points = landmarks[self.jaw_left]
-        right_points = landmarks[self.jaw_right]
-        jaw_bottom = landmarks[self.jaw_bottom]
-        
-        # Current measurements
-        current_left_distance = calculate_distance(left_points[0], left_points[1])
-        current_right_distance = calculate_distance(right_points[0], right_points[1])
-        
-        # Jaw width
-        left_angle = landmarks[self.jaw_left_angle]
-        right_angle = landmarks[self.jaw_right_angle]
-        current_jaw_width = calculate_distance(left_angle, right_angle)
-        
-        # Jaw angle
-        current_jaw_angle = calculate_angle(left_angle, jaw_bottom, right_angle)
-        
-        # Calculate muscle tension (distance from jaw angle to cheek)
-        left_cheek = landmarks[234]
-        right_cheek = landmarks[454]
-        left_tension_distance = calculate_distance(left_angle, left_cheek)
-        right_tension_distance = calculate_distance(right_angle, right_cheek)
-        
-        # Calculate clench score
-        if use_baseline and self.baseline_left_distance is not None:
-            # Clenching typically involves:
-            # 1. Tighter jaw muscles (changed distances)
-            # 2. Slightly wider jaw (muscle bulging)
-            # 3. Changed jaw angle
-            
-            left_change = abs(current_left_distance - self.baseline_left_distance) / self.baseline_left_distance
-            right_change = abs(current_right_distance - self.baseline_right_distance) / self.baseline_right_distance
-            width_change = abs(current_jaw_width - self.baseline_jaw_width) / self.baseline_jaw_width
-            angle_change = abs(current_jaw_angle - self.baseline_jaw_angle) / self.baseline_jaw_angle
-            
-            clench_score = (left_change * 0.25 + right_change * 0.25 + 
-                          width_change * 0.25 + angle_change * 0.25)
-        else:
-            # Use absolute measurements
-            # Tighter jaw indicates clenching
-            avg_distance = (current_left_distance + current_right_distance) / 2.0
-            distance_factor = 1.0 - min(avg_distance * 8, 1.0)
-            
-            # Wider jaw from muscle tension
-            width_factor = min(current_jaw_width * 3, 1.0) - 0.5
-            width_factor = max(0, width_factor)
-            
-            # Angle change (more acute when clenched)
-            angle_factor = 1.0 - (current_jaw_angle / 180.0)
-            
-            clench_score = (distance_factor * 0.4 + width_factor * 0.3 + angle_factor * 0.3)
-        
-        # Normalize and convert to percentage
-        clench_score = np.clip(clench_score * 3.5, 0.0, 1.0)  # Increased sensitivity from 2.0 to 3.5
+        idx = offsets or self.landmark_offsets
+        
+        # Current measurements: jaw line, jaw width, muscle tension (distance
+        # from jaw angle to cheek) and jaw angle
+        (current_left_distance, current_right_distance, current_jaw_width,
+         left_tension_distance, right_tension_distance,
+         current_jaw_angle) = self._measure(landmarks, idx)
+        
+        # Calculate clench score (baseline terms are ignored without a baseline)
+        clench_score = jaw_score(
+            current_left_distance, current_right_distance,
+            current_jaw_width, current_jaw_angle,
+            *self._baseline_args, use_baseline and self._has_baseline)
         clench_percentage = clench_score * 100
         
         # Apply smoothing with less weight to make it more responsive
-        self.history.append(clench_score)
-        if len(self.history) > self.history_size:
-            self.history.pop(0)
+        self.history.push(clench_score)
         
         # Use weighted average favoring recent frames
-        if len(self.history) > 1:
-            weights = np.linspace(0.5, 1.0, len(self.history))
-            smoothed_score = np.average(self.history, weights=weights)
+        filled = len(self.history)
+        if filled > 1:
+            smoothed_score = self.history.weighted_mean(self._smoothing_weights[filled],
+                                                        self._smoothing_sums[filled])
         else:
             smoothed_score = clench_score
         smoothed_percentage = smoothed_score * 100
@@ -151,7 +160,7 @@ class JawAnalyzer:
             'jaw_angle': current_jaw_angle,
             'left_distance': current_left_distance,
             'right_distance': current_right_distance,
-            'has_baseline': self.baseline_left_distance is not None
+            'has_baseline': self._has_baseline
         }
     
     def get_description(self, score: float) -> str:
@@ -179,4 +188,4 @@ class JawAnalyzer:
     
     def reset_history(self):
         """Clear historical data"""
-        self.history = []
+        self.history.clear()
@@ -0,0 +1,268 @@
+"""
+Scoring Kernels
+Per-frame score arithmetic for the pain analyzers, compiled with Numba when
+it is installed (plain Python otherwise)
+
+Each kernel takes the analyzer's current measurements and baselines as
+scalars and returns the clipped 0-1 score. When use_baseline is False the
+baseline arguments are ignored (pass 0.0). fused_scores measures and scores
+all five indicators from one gathered landmark buffer in a single call.
+"""
+
+import numpy as np
+
+from ..utils import njit, dist3, angle3, ieee_div, NUMBA_AVAILABLE
+
+# fastmath without the no-NaN/no-Inf assumptions, so a zero baseline still
+# yields inf/NaN the way numpy division did instead of undefined results;
+# baseline divisions go through ieee_div so the uncompiled fallback agrees
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def _clip01(value):
+    return min(max(value, 0.0), 1.0)
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def brow_score(left_distance, right_distance, angle,
+               baseline_left, baseline_right, baseline_angle, use_baseline):
+    """Brow tension score (0-1)"""
+    if use_baseline:
+        # Furrowed brows typically move closer together and downward
+        left_change = ieee_div(abs(left_distance - baseline_left), baseline_left)
+        right_change = ieee_div(abs(right_distance - baseline_right), baseline_right)
+        angle_change = ieee_div(abs(angle - baseline_angle), baseline_angle)
+        score = (left_change + right_change + angle_change) / 3.0
+    else:
+        # Lower angle and closer eyebrows indicate tension
+        angle_factor = 1.0 - (angle / 180.0)
+        avg_distance = (left_distance + right_distance) / 2.0
+        distance_factor = 1.0 - min(avg_distance * 10, 1.0)
+        score = angle_factor * 0.6 + distance_factor * 0.4
+    return _clip01(score * 3.5)
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def eye_score(left_aperture, right_aperture, left_width, right_width,
+              baseline_left_aperture, baseline_right_aperture,
+              baseline_left_width, baseline_right_width, use_baseline):
+    """
+    Eye squint score (0-1)
+    
+    Returns:
+        Tuple of (score, left_aspect_ratio, right_aspect_ratio)
+    """
+    left_aspect_ratio = left_aperture / left_width if left_width > 0 else 0.0
+    right_aspect_ratio = right_aperture / right_width if right_width > 0 else 0.0
+    
+    if use_baseline:
+        # Squinting reduces aperture; width might also change slightly
+        left_reduction = 1.0 - ieee_div(left_aperture, baseline_left_aperture)
+        right_reduction = 1.0 - ieee_div(right_aperture, baseline_right_aperture)
+        left_width_change = ieee_div(abs(left_width - baseline_left_width), baseline_left_width)
+        right_width_change = ieee_div(abs(right_width - baseline_right_width), baseline_right_width)
+        score = (
+            (left_reduction + right_reduction) * 0.7 +
+            (left_width_change + right_width_change) * 0.3
+        ) / 2.0
+    else:
+        # Normal eye aspect ratio is around 0.25-0.35; squinting drops it
+        avg_aspect_ratio = (left_aspect_ratio + right_aspect_ratio) / 2.0
+        normal_ratio = 0.30
+        score = max(0.0, normal_ratio - avg_aspect_ratio) / normal_ratio
+    return _clip01(score * 3.5), left_aspect_ratio, right_aspect_ratio
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def grimace_score(corner_distance, vertical_distance, lip_distance, corner_depression,
+                  baseline_corner, baseline_vertical, baseline_lip, use_baseline):
+    """Grimace score (0-1)"""
+    if use_baseline:
+        corner_change = ieee_div(abs(corner_distance - baseline_corner), baseline_corner)
+        vertical_change = ieee_div(abs(vertical_distance - baseline_vertical), baseline_vertical)
+        lip_change = ieee_div(abs(lip_distance - baseline_lip), baseline_lip)
+        score = corner_change * 0.4 + vertical_change * 0.3 + lip_change * 0.3
+    else:
+        # Tight mouth indicates grimacing
+        corner_factor = 1.0 - min(corner_distance * 5, 1.0)
+        vertical_factor = 1.0 - min(vertical_distance * 20, 1.0)
+        depression_factor = min(corner_depression * 50, 1.0)
+        score = corner_factor * 0.35 + vertical_factor * 0.35 + depression_factor * 0.30
+    return _clip01(score * 3.0)
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def jaw_score(left_distance, right_distance, jaw_width, jaw_angle,
+              baseline_left, baseline_right, baseline_width, baseline_angle, use_baseline):
+    """Jaw clench score (0-1)"""
+    if use_baseline:
+        left_change = ieee_div(abs(left_distance - baseline_left), baseline_left)
+        right_change = ieee_div(abs(right_distance - baseline_right), baseline_right)
+        width_change = ieee_div(abs(jaw_width - baseline_width), baseline_width)
+        angle_change = ieee_div(abs(jaw_angle - baseline_angle), baseline_angle)
+        score = (left_change * 0.25 + right_change * 0.25 +
+                 width_change * 0.25 + angle_change * 0.25)
+    else:
+        # Tighter jaw, wider jaw (muscle bulging) and a more acute angle
+        avg_distance = (left_distance + right_distance) / 2.0
+        distance_factor = 1.0 - min(avg_distance * 8, 1.0)
+        width_factor = max(0.0, min(jaw_width * 3, 1.0) - 0.5)
+        angle_factor = 1.0 - (jaw_angle / 180.0)
+        score = distance_factor * 0.4 + width_factor * 0.3 + angle_factor * 0.3
+    return _clip01(score * 3.5)
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def nasolabial_score(left_depth, right_depth, left_angle, right_angle,
+                     baseline_left_depth, baseline_right_depth,
+                     baseline_left_angle, baseline_right_angle, use_baseline):
+    """Nasolabial strain score (0-1)"""
+    if use_baseline:
+        # Deepening folds indicate strain
+        left_depth_change = ieee_div(abs(left_depth - baseline_left_depth), baseline_left_depth)
+        right_depth_change = ieee_div(abs(right_depth - baseline_right_depth), baseline_right_depth)
+        left_angle_change = ieee_div(abs(left_angle - baseline_left_angle), baseline_left_angle)
+        right_angle_change = ieee_div(abs(right_angle - baseline_right_angle), baseline_right_angle)
+        score = (
+            (left_depth_change + right_depth_change) * 0.6 +
+            (left_angle_change + right_angle_change) * 0.4
+        ) / 2.0
+    else:
+        avg_depth = (left_depth + right_depth) / 2.0
+        depth_factor = min(avg_depth * 30, 1.0)
+        avg_angle = (left_angle + right_angle) / 2.0
+        angle_factor = 1.0 - (avg_angle / 180.0)
+        score = depth_factor * 0.6 + angle_factor * 0.4
+    return _clip01(score * 2.5)
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _pair_dist(buf, a, b):
+    return dist3(buf[a, 0], buf[a, 1], buf[a, 2], buf[b, 0], buf[b, 1], buf[b, 2])
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def _triplet_angle(buf, a, v, c):
+    return angle3(buf[a, 0], buf[a, 1], buf[a, 2],
+                  buf[v, 0], buf[v, 1], buf[v, 2],
+                  buf[c, 0], buf[c, 1], buf[c, 2])
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def _fold_depth(buf, nose, fold, mouth):
+    # Perpendicular distance from the fold point to the nose-mouth line
+    lx = buf[mouth, 0] - buf[nose, 0]
+    ly = buf[mouth, 1] - buf[nose, 1]
+    lz = buf[mouth, 2] - buf[nose, 2]
+    line_len = (lx * lx + ly * ly + lz * lz) ** 0.5
+    if line_len == 0:
+        return 0.0
+    lx /= line_len
+    ly /= line_len
+    lz /= line_len
+    projection = ((buf[fold, 0] - buf[nose, 0]) * lx +
+                  (buf[fold, 1] - buf[nose, 1]) * ly +
+                  (buf[fold, 2] - buf[nose, 2]) * lz)
+    return dist3(buf[fold, 0], buf[fold, 1], buf[fold, 2],
+                 buf[nose, 0] + projection * lx,
+                 buf[nose, 1] + projection * ly,
+                 buf[nose, 2] + projection * lz)
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def fused_scores(buf, idx, baselines, use_baseline, out):
+    """
+    Raw scores of all five indicators from one landmark buffer
+    
+    Args:
+        buf: Landmark buffer, shape (U, 3)
+        idx: Row of buf for each point, the analyzers' index arrays
+             concatenated in output order (brow 5, grimace 6, eye 8,
+             jaw 13, nasolabial 6); see LandmarkView
+        baselines: Baseline measurements per indicator, shape (5, 4); the
+                   columns follow the baseline arguments of each score kernel
+        use_baseline: Per-indicator flag, shape (5,)
+        out: Output scores, shape (5,), ordered brow, grimace, eye, jaw,
+             nasolabial
+    """
+    # Brow: eyebrow spans and the angle at the nose bridge
+    left0, left1, right0, right1, nose = idx[0], idx[1], idx[2], idx[3], idx[4]
+    angle = angle3((buf[left0, 0] + buf[left1, 0]) / 2, (buf[left0, 1] + buf[left1, 1]) / 2,
+                   (buf[left0, 2] + buf[left1, 2]) / 2,
+                   buf[nose, 0], buf[nose, 1], buf[nose, 2],
+                   (buf[right0, 0] + buf[right1, 0]) / 2, (buf[right0, 1] + buf[right1, 1]) / 2,
+                   (buf[right0, 2] + buf[right1, 2]) / 2)
+    out[0] = brow_score(_pair_dist(buf, left0, left1), _pair_dist(buf, right0, right1), angle,
+                        baselines[0, 0], baselines[0, 1], baselines[0, 2], use_baseline[0])
+    
+    # Grimace: pairs (corners, center, lips) at 5..7 and 8..10
+    corner_depression = max(0.0, (buf[idx[5], 1] + buf[idx[8], 1]) / 2 -
+                                 (buf[idx[6], 1] + buf[idx[9], 1]) / 2)
+    out[1] = grimace_score(_pair_dist(buf, idx[5], idx[8]), _pair_dist(buf, idx[6], idx[9]),
+                           _pair_dist(buf, idx[7], idx[10]), corner_depression,
+                           baselines[1, 0], baselines[1, 1], baselines[1, 2], use_baseline[1])
+    
+    # Eye: pairs (apertures, widths) at 11..14 and 15..18
+    out[2] = eye_score(_pair_dist(buf, idx[11], idx[15]), _pair_dist(buf, idx[12], idx[16]),
+                       _pair_dist(buf, idx[13], idx[17]), _pair_dist(buf, idx[14], idx[18]),
+                       baselines[2, 0], baselines[2, 1], baselines[2, 2], baselines[2, 3],
+                       use_baseline[2])[0]
+    
+    # Jaw: pairs at 19..23 and 24..28 (the tension pairs are not scored),
+    # chin angle triplet at 29..31
+    out[3] = jaw_score(_pair_dist(buf, idx[19], idx[24]), _pair_dist(buf, idx[20], idx[25]),
+                       _pair_dist(buf, idx[21], idx[26]),
+                       _triplet_angle(buf, idx[29], idx[30], idx[31]),
+                       baselines[3, 0], baselines[3, 1], baselines[3, 2], baselines[3, 3],
+                       use_baseline[3])
+    
+    # Nasolabial: (nose, fold, mouth) triplets at 32..34 (left), 35..37 (right)
+    out[4] = nasolabial_score(_fold_depth(buf, idx[32], idx[33], idx[34]),
+                              _fold_depth(buf, idx[35], idx[36], idx[37]),
+                              _triplet_angle(buf, idx[32], idx[33], idx[34]),
+                              _triplet_angle(buf, idx[35], idx[36], idx[37]),
+                              baselines[4, 0], baselines[4, 1], baselines[4, 2], baselines[4, 3],
+                              use_baseline[4])
+
+
+@njit(cache=True, fastmath=_FASTMATH, error_model="numpy")
+def fused_scores_batch(bufs, idx, baselines, use_baseline, out):
+    """
+    fused_scores for a batch of frames
+    
+    Args:
+        bufs: Landmark buffers, shape (N, U, 3)
+        idx: As for fused_scores
+        baselines: As for fused_scores
+        use_baseline: As for fused_scores
+        out: Output scores, shape (N, 5)
+    """
+    for k in range(bufs.shape[0]):
+        fused_scores(bufs[k], idx, baselines, use_baseline, out[k])
+
+
+def precompile() -> bool:
+    """
+    Compile every scoring kernel for the argument types used at runtime
+    
+    All kernels are cached on disk, so running this once at setup time
+    (verify_setup.py does) means later processes only load machine code
+    instead of compiling on the first frame.
+    
+    Returns:
+        bool: True if the kernels were compiled, False without Numba
+    """
+    if not NUMBA_AVAILABLE:
+        return False
+    
+    brow_score(0.1, 0.1, 90.0, 0.1, 0.1, 90.0, False)
+    eye_score(0.1, 0.1, 0.3, 0.3, 0.1, 0.1, 0.3, 0.3, False)
+    grimace_score(0.1, 0.1, 0.1, 0.0, 0.1, 0.1, 0.1, False)
+    jaw_score(0.1, 0.1, 0.3, 90.0, 0.1, 0.1, 0.3, 90.0, False)
+    nasolabial_score(0.01, 0.01, 90.0, 90.0, 0.01, 0.01, 90.0, 90.0, False)
+    fused_scores(np.ones((38, 3), dtype=np.float32), np.arange(38, dtype=np.intp),
+                 np.zeros((5, 4)), np.zeros(5, dtype=np.bool_), np.zeros(5))
+    fused_scores_batch(np.ones((1, 38, 3), dtype=np.float32), np.arange(38, dtype=np.intp),
+                       np.zeros((5, 4)), np.zeros(5, dtype=np.bool_), np.zeros((1, 5)))
+    return True
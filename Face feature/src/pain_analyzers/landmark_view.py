@@ -0,0 +1,266 @@
+"""
+Landmark View
+Shared per-frame landmark gather for a set of pain analyzers
+"""
+
+import numpy as np
+from typing import Dict, Any
+
+from .brow_analyzer import BrowAnalyzer
+from .grimace_analyzer import GrimaceAnalyzer
+from .eye_analyzer import EyeAnalyzer
+from .jaw_analyzer import JawAnalyzer
+from .nasolabial_analyzer import NasolabialAnalyzer
+from .kernels import fused_scores, fused_scores_batch
+
+# Per indicator, in fused_scores output order: analyzer class and the
+# landmark_offsets keys concatenated into the fused index array
+_FUSED_LAYOUT = (
+    (BrowAnalyzer, ('eyebrow_left', 'eyebrow_right', 'nose_bridge')),
+    (GrimaceAnalyzer, ('pair_a', 'pair_b')),
+    (EyeAnalyzer, ('pair_a', 'pair_b')),
+    (JawAnalyzer, ('pair_a', 'pair_b', 'angle')),
+    (NasolabialAnalyzer, ('angle',)),
+)
+
+
+class LandmarkView:
+    """
+    Gathers every landmark a set of analyzers reads with one take per frame
+    
+    Each analyzer lists the index arrays it reads in `landmark_offsets`. The
+    view takes the union of those indices once, then remaps each analyzer's
+    arrays to positions in the compact (U, 3) buffer, so overlapping regions
+    (e.g. mouth corners used by grimace and nasolabial) are copied only once.
+    
+    With one analyzer of each of the five types, smoothed_scores() also
+    scores all of them in a single compiled call, and smoothed_scores_batch()
+    does the same for a whole (N, 468, 3) sequence of frames.
+    """
+    
+    def __init__(self, analyzers: Dict[str, Any]):
+        """
+        Initialize the landmark view
+        
+        Args:
+            analyzers: Analyzer instances by name (must have landmark_offsets)
+        """
+        self.analyzers = dict(analyzers)
+        
+        # Union of all indices read by the analyzers, in landmark order
+        self._all_idx = np.unique(np.concatenate([
+            np.ravel(idx)
+            for analyzer in self.analyzers.values()
+            for idx in analyzer.landmark_offsets.values()
+        ])).astype(np.int32)
+        
+        # Shortest landmark array that covers every index. gather() checks
+        # this once so np.take can skip its per-index bounds check (mode='clip')
+        self._min_landmarks = int(self._all_idx[-1]) + 1
+        
+        # Landmark index -> position in the gathered buffer
+        lookup = np.zeros(self._min_landmarks, dtype=np.intp)
+        lookup[self._all_idx] = np.arange(len(self._all_idx))
+        
+        # Gather target reused every frame
+        self._gather_buf = np.empty((len(self._all_idx), 3), dtype=np.float32)
+        
+        self.offset_map = {
+            name: {key: lookup[idx] for key, idx in analyzer.landmark_offsets.items()}
+            for name, analyzer in self.analyzers.items()
+        }
+        
+        self._fused_analyzers = None
+        self._fused_idx = None
+        by_type = {type(analyzer): name for name, analyzer in self.analyzers.items()}
+        if len(by_type) == len(self.analyzers) and all(cls in by_type for cls, _ in _FUSED_LAYOUT):
+            names = [by_type[cls] for cls, _ in _FUSED_LAYOUT]
+            self._fused_analyzers = [self.analyzers[name] for name in names]
+            self._fused_idx = np.concatenate([
+                np.ravel(self.offset_map[name][key])
+                for name, (_, keys) in zip(names, _FUSED_LAYOUT)
+                for key in keys
+            ])
+            self._baselines = np.zeros((len(_FUSED_LAYOUT), 4))
+            self._use_baseline = np.zeros(len(_FUSED_LAYOUT), dtype=np.bool_)
+            self._packed_args = [None] * len(_FUSED_LAYOUT)
+            self._scores = np.zeros(len(_FUSED_LAYOUT))
+            self._init_shared_history()
+            
+            # Compile the fused kernel up front so the first frame is not slow
+            fused_scores(np.ones((len(self._all_idx), 3), dtype=np.float32), self._fused_idx,
+                         self._baselines, self._use_baseline, self._scores)
+    
+    def _init_shared_history(self):
+        """
+        Back the five analyzers' histories with rows of one (5, size) array
+        
+        Each analyzer's RingBuffer keeps working on its own row, while
+        smoothed_scores() can push and smooth all five with one column write
+        and one matrix-vector product. Skipped if the analyzers' history
+        sizes or smoothing weights differ.
+        """
+        self._hist = None
+        histories = [analyzer.history for analyzer in self._fused_analyzers]
+        size = histories[0].buf.size
+        weights = self._fused_analyzers[0]._smoothing_weights
+        if any(history.buf.size != size or history.buf.dtype != histories[0].buf.dtype
+               for history in histories):
+            return
+        if any(not all(np.array_equal(w, v) for w, v in zip(weights, analyzer._smoothing_weights))
+               for analyzer in self._fused_analyzers):
+            return
+        
+        self._hist = np.stack([history.buf for history in histories])
+        for row, history in zip(self._hist, histories):
+            history.buf = row
+        
+        # Normalized weights per buffer position after a push: while filling
+        # (head == count) the first count slots are used; once full the
+        # oldest sample sits at head, so the full weight vector is rotated
+        self._fill_weights = [np.pad(w / w.sum(), (0, size - len(w))) if len(w) else None
+                              for w in weights]
+        full = weights[size] / weights[size].sum()
+        self._wrap_weights = [np.roll(full, head) for head in range(size)]
+    
+    def gather(self, landmarks: np.ndarray) -> np.ndarray:
+        """
+        Copy the landmarks used by the analyzers into one contiguous buffer
+        
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+        
+        Returns:
+            np.ndarray: Gathered landmarks, shape (U, 3), contiguous float32;
+                        the same buffer is overwritten by the next call
+        """
+        landmarks = np.asarray(landmarks)
+        if len(landmarks) < self._min_landmarks:
+            raise IndexError(f"need at least {self._min_landmarks} landmarks, got {len(landmarks)}")
+        if landmarks.dtype == np.float32:
+            return np.take(landmarks, self._all_idx, axis=0, out=self._gather_buf, mode='clip')
+        
+        # Cast after the gather so only the U used points are converted
+        np.copyto(self._gather_buf, np.take(landmarks, self._all_idx, axis=0, mode='clip'))
+        return self._gather_buf
+    
+    def set_baseline(self, landmarks: np.ndarray):
+        """
+        Set the baseline of every analyzer from one frame
+        
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+        """
+        buf = self.gather(landmarks)
+        for name, analyzer in self.analyzers.items():
+            analyzer.set_baseline(buf, offsets=self.offset_map[name])
+    
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, Dict[str, float]]:
+        """
+        Run every analyzer on one frame
+        
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+            use_baseline: Whether to use baseline comparison
+        
+        Returns:
+            Dict of analyzer name -> that analyzer's analyze() result
+        """
+        buf = self.gather(landmarks)
+        return {
+            name: analyzer.analyze(buf, use_baseline, offsets=self.offset_map[name])
+            for name, analyzer in self.analyzers.items()
+        }
+    
+    def _sync_baselines(self, use_baseline: bool):
+        """
+        Repack the fused baselines, only where an analyzer's baseline changed
+        
+        Args:
+            use_baseline: Whether to use baseline comparison
+        """
+        if self._fused_analyzers is None:
+            raise ValueError("fused scoring needs exactly one analyzer of each of the five types")
+        
+        for k, analyzer in enumerate(self._fused_analyzers):
+            args = analyzer._baseline_args
+            if args != self._packed_args[k]:
+                self._baselines[k, :len(args)] = args
+                self._packed_args[k] = args
+            self._use_baseline[k] = use_baseline and analyzer._has_baseline
+    
+    def smoothed_scores(self, landmarks: np.ndarray, use_baseline: bool = True) -> np.ndarray:
+        """
+        Smoothed score of every indicator from one compiled call
+        
+        Same scores and history updates as analyze(), without building the
+        per-analyzer result dicts.
+        
+        Args:
+            landmarks: Facial landmarks array (468, 3)
+            use_baseline: Whether to use baseline comparison
+        
+        Returns:
+            np.ndarray: Smoothed 0-1 scores (float64) for brow, grimace, eye,
+                        jaw and nasolabial, i.e. PAIN_INDICATOR_ORDER
+        """
+        self._sync_baselines(use_baseline)
+        buf = self.gather(landmarks)
+        fused_scores(buf, self._fused_idx, self._baselines, self._use_baseline, self._scores)
+        
+        histories = [analyzer.history for analyzer in self._fused_analyzers]
+        head, count = histories[0].head, histories[0].count
+        if self._hist is not None and all(
+                history.head == head and history.count == count for history in histories):
+            # Histories in step: push and smooth all five at once
+            size = self._hist.shape[1]
+            self._hist[:, head] = self._scores
+            head = (head + 1) % size
+            count = min(count + 1, size)
+            for history in histories:
+                history.head = head
+                history.count = count
+            weights = self._fill_weights[count] if count < size else self._wrap_weights[head]
+            return self._hist @ weights
+        
+        smoothed = np.empty(len(self._fused_analyzers))
+        for k, analyzer in enumerate(self._fused_analyzers):
+            score = float(self._scores[k])
+            analyzer.history.push(score)
+            filled = len(analyzer.history)
+            if filled > 1:
+                score = analyzer.history.weighted_mean(analyzer._smoothing_weights[filled],
+                                                       analyzer._smoothing_sums[filled])
+            smoothed[k] = score
+        return smoothed
+    
+    def smoothed_scores_batch(self, landmarks: np.ndarray, use_baseline: bool = True) -> np.ndarray:
+        """
+        smoothed_scores() for a sequence of frames in one compiled call
+        
+        Gives the same scores and history updates as calling smoothed_scores()
+        on each frame in order. Meant for
+        video-file mode; live capture keeps the per-frame call.
+        
+        Args:
+            landmarks: Facial landmarks for N frames, shape (N, 468, 3)
+            use_baseline: Whether to use baseline comparison
+        
+        Returns:
+            np.ndarray: Smoothed 0-1 scores (float64), shape (N, 5), columns
+                        in PAIN_INDICATOR_ORDER
+        """
+        self._sync_baselines(use_baseline)
+        
+        # One gather for the whole batch, cast to float32 after the take
+        landmarks = np.asarray(landmarks)
+        if landmarks.shape[1] < self._min_landmarks:
+            raise IndexError(f"need at least {self._min_landmarks} landmarks per frame, got {landmarks.shape[1]}")
+        bufs = np.take(landmarks, self._all_idx, axis=1, mode='clip').astype(np.float32, copy=False)
+        scores = np.empty((len(bufs), len(self._fused_analyzers)))
+        fused_scores_batch(bufs, self._fused_idx, self._baselines, self._use_baseline, scores)
+        
+        smoothed = np.empty_like(scores)
+        for k, analyzer in enumerate(self._fused_analyzers):
+            smoothed[:, k] = analyzer.history.push_smoothed(scores[:, k], analyzer._smoothing_weights)
+        return smoothed
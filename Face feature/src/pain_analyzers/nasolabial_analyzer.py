@@ -5,11 +5,9 @@ Analyzes nasolabial fold depth changes indicating facial strain
 
 import numpy as np
 from typing import Dict, Tuple
-import sys
-from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
-from utils import calculate_distance, calculate_angle
+from ..utils import angles_batch, RingBuffer
+from .kernels import nasolabial_score
 
 
 class NasolabialAnalyzer:
@@ -22,8 +20,8 @@ class NasolabialAnalyzer:
         Args:
             landmark_indices: Dictionary containing landmark indices for nasolabial area
         """
-        self.nasolabial_left = landmark_indices.get('nasolabial_left', [48])
-        self.nasolabial_right = landmark_indices.get('nasolabial_right', [278])
+        self.nasolabial_left = np.asarray(landmark_indices.get('nasolabial_left', [48]), dtype=np.intp)
+        self.nasolabial_right = np.asarray(landmark_indices.get('nasolabial_right', [278]), dtype=np.intp)
         
         # Additional landmarks for fold analysis
         self.nose_bottom_left = 98
@@ -33,6 +31,16 @@ class NasolabialAnalyzer:
         self.cheek_left = 205
         self.cheek_right = 425
         
+        # Fold angle triplets (nose, fold vertex, mouth), left then right
+        self._angle_idx = np.array([
+            [self.nose_bottom_left, self.nasolabial_left[0], self.mouth_corner_left],
+            [self.nose_bottom_right, self.nasolabial_right[0], self.mouth_corner_right],
+        ], dtype=np.intp)
+        
+        # Index arrays read each frame, by name (LandmarkView remaps these onto
+        # its gathered buffer)
+        self.landmark_offsets = {'angle': self._angle_idx}
+        
         # Baseline values
         self.baseline_left_depth = None
         self.baseline_right_depth = None
@@ -40,135 +48,130 @@ class NasolabialAnalyzer:
         self.baseline_fold_angle_right = None
         
         # Historical data
-        self.history = []
         self.history_size = 5  # Reduced from 10 for faster response
+        self.history = RingBuffer(self.history_size)
+        
+        # Recency weights for each possible history length
+        self._smoothing_weights = [np.linspace(0.5, 1.0, n) for n in range(self.history_size + 1)]
+        self._smoothing_sums = [float(w.sum()) for w in self._smoothing_weights]
+        
+        # Compile the scoring kernel up front so the first frame is not slow
+        nasolabial_score(0.01, 0.01, 90.0, 90.0, 0.01, 0.01, 90.0, 90.0, False)
     
-    def set_baseline(self, landmarks: np.ndarray):
+    def set_baseline(self, landmarks: np.ndarray, offsets: Dict[str, np.ndarray] = None):
         """
         Set baseline measurements from neutral expression
         
         Args:
             landmarks: Facial landmarks array (468, 3)
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         """
-        # Left side
-        left_fold = landmarks[self.nasolabial_left[0]]
-        nose_left = landmarks[self.nose_bottom_left]
-        mouth_left = landmarks[self.mouth_corner_left]
-        cheek_left = landmarks[self.cheek_left]
-        
-        # Calculate depth as distance from fold point to line between nose and mouth
-        self.baseline_left_depth = self._calculate_fold_depth(left_fold, nose_left, mouth_left)
-        self.baseline_fold_angle_left = calculate_angle(nose_left, left_fold, mouth_left)
-        
-        # Right side
-        right_fold = landmarks[self.nasolabial_right[0]]
-        nose_right = landmarks[self.nose_bottom_right]
-        mouth_right = landmarks[self.mouth_corner_right]
-        cheek_right = landmarks[self.cheek_right]
-        
-        self.baseline_right_depth = self._calculate_fold_depth(right_fold, nose_right, mouth_right)
-        self.baseline_fold_angle_right = calculate_angle(nose_right, right_fold, mouth_right)
+        idx = offsets or self.landmark_offsets
+        
+        # Fold depths and angles, left then right
+        (self.baseline_left_depth, self.baseline_right_depth,
+         self.baseline_fold_angle_left, self.baseline_fold_angle_right) = self._measure(landmarks, idx)
     
-    def _calculate_fold_depth(self, fold_point: np.ndarray, nose_point: np.ndarray, 
-                             mouth_point: np.ndarray) -> float:
+    @property
+    def _baseline_args(self) -> tuple:
+        """Baseline in score kernel argument order, read from the baseline_* attributes"""
+        if not self._has_baseline:
+            return (0.0, 0.0, 0.0, 0.0)
+        return (self.baseline_left_depth,
+                self.baseline_right_depth,
+                self.baseline_fold_angle_left,
+                self.baseline_fold_angle_right)
+    
+    @property
+    def _has_baseline(self) -> bool:
+        """Whether a baseline is set (set_baseline or assigning the baseline_* attributes)"""
+        return self.baseline_left_depth is not None
+    
+    def _measure(self, landmarks: np.ndarray, idx: Dict[str, np.ndarray]) -> Tuple[float, float, float, float]:
         """
-        Calculate the depth of nasolabial fold
+        Fold depths and angles for both sides from one gather
         
         Args:
-            fold_point: Point on the fold
-            nose_point: Point near nose
-            mouth_point: Point near mouth
+            landmarks: Facial landmarks array (468, 3)
+            idx: Index arrays to read with (see landmark_offsets)
         
         Returns:
-            float: Depth measure
+            Tuple of (left_depth, right_depth, left_angle, right_angle)
+        """
+        # Nose, fold and mouth points, shape (2, 3, 3) for left and right
+        pts = landmarks[idx['angle']]
+        nose_pts, fold_pts, mouth_pts = pts[:, 0], pts[:, 1], pts[:, 2]
+        
+        depths = self._fold_depth_batch(fold_pts, nose_pts, mouth_pts)
+        angles = angles_batch(nose_pts, fold_pts, mouth_pts)
+        return (*depths.tolist(), *angles.tolist())
+    
+    def _fold_depth_batch(self, fold_pts: np.ndarray, nose_pts: np.ndarray,
+                          mouth_pts: np.ndarray) -> np.ndarray:
         """
-        # Calculate perpendicular distance from fold point to line between nose and mouth
-        # Using point-to-line distance formula
-        line_vec = mouth_point - nose_point
-        point_vec = fold_point - nose_point
+        Calculate the depth of several nasolabial folds at once
         
-        line_len = np.linalg.norm(line_vec)
-        if line_len == 0:
-            return 0
+        Depth is the perpendicular distance from the fold point to the line
+        between nose and mouth (0 when nose and mouth coincide).
         
-        line_unitvec = line_vec / line_len
-        projection = np.dot(point_vec, line_unitvec)
+        Args:
+            fold_pts: Points on the folds, shape (K, 3)
+            nose_pts: Points near the nose, shape (K, 3)
+            mouth_pts: Points near the mouth, shape (K, 3)
         
-        # Point on line closest to fold_point
-        closest_point = nose_point + projection * line_unitvec
+        Returns:
+            np.ndarray: Depth of each fold, shape (K,)
+        """
+        line_vec = mouth_pts - nose_pts
+        point_vec = fold_pts - nose_pts
         
-        # Distance is the depth
-        depth = np.linalg.norm(fold_point - closest_point)
+        line_len = np.linalg.norm(line_vec, axis=-1, keepdims=True)
+        valid = line_len[:, 0] > 0
+        line_unitvec = line_vec / np.where(line_len > 0, line_len, 1.0)
+        projection = np.einsum('ij,ij->i', point_vec, line_unitvec)
         
-        return depth
+        # Point on each line closest to its fold point
+        closest_pts = nose_pts + projection[:, None] * line_unitvec
+        
+        depth = np.linalg.norm(fold_pts - closest_pts, axis=-1)
+        return np.where(valid, depth, 0.0)
     
-    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True) -> Dict[str, float]:
+    def analyze(self, landmarks: np.ndarray, use_baseline: bool = True,
+                offsets: Dict[str, np.ndarray] = None) -> Dict[str, float]:
         """
         Analyze nasolabial deepening from landmarks
         
         Args:
             landmarks: Facial landmarks array (468, 3)
             use_baseline: Whether to use baseline comparison
+            offsets: Index arrays to read with (from LandmarkView); defaults to
+                landmark_offsets, i.e. landmarks is the full (468, 3) array
         
         Returns:
             Dict containing analysis results
         """
-        # Left side measurements
-        left_fold = landmarks[self.nasolabial_left[0]]
-        nose_left = landmarks[self.nose_bottom_left]
-        mouth_left = landmarks[self.mouth_corner_left]
-        cheek_left = landmarks[self.cheek_left]
-        
-        current_left_depth = self._calculate_fold_depth(left_fold, nose_left, mouth_left)
-        current_fold_angle_left = calculate_angle(nose_left, left_fold, mouth_left)
-        
-        # Right side measurements
-        right_fold = landmarks[self.nasolabial_right[0]]
-        nose_right = landmarks[self.nose_bottom_right]
-        mouth_right = landmarks[self.mouth_corner_right]
-        cheek_right = landmarks[self.cheek_right]
-        
-        current_right_depth = self._calculate_fold_depth(right_fold, nose_right, mouth_right)
-        current_fold_angle_right = calculate_angle(nose_right, right_fold, mouth_right)
-        
-        # Calculate strain score
-        if use_baseline and self.baseline_left_depth is not None:
-            # Deepening folds indicate strain
-            left_depth_change = abs(current_left_depth - self.baseline_left_depth) / self.baseline_left_depth
-            right_depth_change = abs(current_right_depth - self.baseline_right_depth) / self.baseline_right_depth
-            
-            left_angle_change = abs(current_fold_angle_left - self.baseline_fold_angle_left) / self.baseline_fold_angle_left
-            right_angle_change = abs(current_fold_angle_right - self.baseline_fold_angle_right) / self.baseline_fold_angle_right
-            
-            strain_score = (
-                (left_depth_change + right_depth_change) * 0.6 +
-                (left_angle_change + right_angle_change) * 0.4
-            ) / 2.0
-        else:
-            # Use absolute measurements
-            # Deeper folds indicate more strain
-            avg_depth = (current_left_depth + current_right_depth) / 2.0
-            depth_factor = min(avg_depth * 30, 1.0)  # Scale depth
-            
-            # Angle changes
-            avg_angle = (current_fold_angle_left + current_fold_angle_right) / 2.0
-            angle_factor = 1.0 - (avg_angle / 180.0)
-            
-            strain_score = (depth_factor * 0.6 + angle_factor * 0.4)
-        
-        # Normalize and convert to percentage
-        strain_score = np.clip(strain_score * 2.5, 0.0, 1.0)  # Increased sensitivity from 1.5 to 2.5
+        idx = offsets or self.landmark_offsets
+        
+        # Fold depths and angles, left then right
+        (current_left_depth, current_right_depth,
+         current_fold_angle_left, current_fold_angle_right) = self._measure(landmarks, idx)
+        
+        # Calculate strain score (baseline terms are ignored without a baseline)
+        strain_score = nasolabial_score(
+            current_left_depth, current_right_depth,
+            current_fold_angle_left, current_fold_angle_right,
+            *self._baseline_args, use_baseline and self._has_baseline)
         strain_percentage = strain_score * 100
         
         # Apply smoothing with less weight to make it more responsive
-        self.history.append(strain_score)
-        if len(self.history) > self.history_size:
-            self.history.pop(0)
+        self.history.push(strain_score)
         
         # Use weighted average favoring recent frames
-        if len(self.history) > 1:
-            weights = np.linspace(0.5, 1.0, len(self.history))
-            smoothed_score = np.average(self.history, weights=weights)
+        filled = len(self.history)
+        if filled > 1:
+            smoothed_score = self.history.weighted_mean(self._smoothing_weights[filled],
+                                                        self._smoothing_sums[filled])
         else:
             smoothed_score = strain_score
         smoothed_percentage = smoothed_score * 100
@@ -182,7 +185,7 @@ class NasolabialAnalyzer:
             'right_depth': current_right_depth,
             'left_angle': current_fold_angle_left,
             'right_angle': current_fold_angle_right,
-            'has_baseline': self.baseline_left_depth is not None
+            'has_baseline': self._has_baseline
         }
     
     def get_description(self, score: float) -> str:
@@ -210,4 +213,4 @@ class NasolabialAnalyzer:
     
     def reset_history(self):
         """Clear historical data"""
-        self.history = []
+        self.history.clear()
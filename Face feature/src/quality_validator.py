@@ -3,21 +3,123 @@ Quality Validator
 Validates face detection quality, lighting, and visibility
 """
 
+import math
+from itertools import chain
+
 import cv2
 import numpy as np
 from typing import Dict, List, Tuple
-import sys
-from pathlib import Path
-
-sys.path.append(str(Path(__file__).parent.parent))
 
+# config lives in the project root, which entry points put on sys.path
 from config import (
     FACE_DETECTION_QUALITY,
     LIGHTING_QUALITY_THRESHOLD,
     CONFIDENCE_THRESHOLDS,
-    ERROR_MESSAGES
+    ERROR_MESSAGES,
+    classify_confidence,
+    classify_quality
 )
-from src.utils import check_lighting_quality
+from .utils import check_lighting_quality, njit
+
+
+# Landmark kernels are compiled eagerly for these C-contiguous layouts;
+# _kernel_input coerces anything else once at the validator entry
+_LANDMARK_SIGNATURES = ["(float32[:, ::1],)", "(float64[:, ::1],)"]
+
+
+def _has_landmark_shape(landmarks: np.ndarray) -> bool:
+    """Whether landmarks is a non-empty (N, >=3) array the kernels can read"""
+    return landmarks.ndim == 2 and landmarks.shape[0] > 0 and landmarks.shape[1] >= 3
+
+
+def _kernel_input(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Landmarks as a C-contiguous float32/float64 array (no copy if already)
+    
+    The kernels skip bounds checks, so the shape is checked here instead.
+    
+    Raises:
+        ValueError: If landmarks is not a non-empty (N, >=3) array
+    """
+    landmarks = np.asarray(landmarks)
+    if not _has_landmark_shape(landmarks):
+        raise ValueError(f"Expected landmarks of shape (N, 3), got {landmarks.shape}")
+    dtype = np.float32 if landmarks.dtype == np.float32 else np.float64
+    return np.ascontiguousarray(landmarks, dtype=dtype)
+
+
+@njit(_LANDMARK_SIGNATURES, cache=True, boundscheck=False)
+def _scan_landmarks(landmarks):
+    """
+    Single sweep over the landmarks for validate_landmarks
+    
+    Args:
+        landmarks: Landmark array (N, 3)
+    
+    Returns:
+        Tuple of (has_invalid, x_in_range, y_in_range, valid_x, valid_y, var_z);
+        has_invalid flags any NaN/Inf, the range flags use [-0.1, 1.1] and the
+        valid counts use [0, 1]. The rest is not meaningful when has_invalid.
+    """
+    n = landmarks.shape[0]
+    has_invalid = False
+    x_in_range = True
+    y_in_range = True
+    valid_x = 0
+    valid_y = 0
+    sum_z = 0.0
+    sum_z2 = 0.0
+    
+    for i in range(n):
+        x = float(landmarks[i, 0])
+        y = float(landmarks[i, 1])
+        z = float(landmarks[i, 2])
+        if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+            has_invalid = True
+            break
+        if x < -0.1 or x > 1.1:
+            x_in_range = False
+        if y < -0.1 or y > 1.1:
+            y_in_range = False
+        if 0.0 <= x <= 1.0:
+            valid_x += 1
+        if 0.0 <= y <= 1.0:
+            valid_y += 1
+        sum_z += z
+        sum_z2 += z * z
+    
+    mean_z = sum_z / n
+    var_z = max(sum_z2 / n - mean_z * mean_z, 0.0)
+    return has_invalid, x_in_range, y_in_range, valid_x, valid_y, var_z
+
+
+@njit(_LANDMARK_SIGNATURES, cache=True, boundscheck=False)
+def _bbox_xy(landmarks):
+    """
+    x/y bounding box of the landmarks in one pass (NaN propagates like np.min)
+    
+    Args:
+        landmarks: Landmark array (N, 3)
+    
+    Returns:
+        Tuple of (min_x, max_x, min_y, max_y)
+    """
+    min_x = max_x = float(landmarks[0, 0])
+    min_y = max_y = float(landmarks[0, 1])
+    
+    for i in range(1, landmarks.shape[0]):
+        x = float(landmarks[i, 0])
+        y = float(landmarks[i, 1])
+        if x < min_x or math.isnan(x):
+            min_x = x
+        if x > max_x or math.isnan(x):
+            max_x = x
+        if y < min_y or math.isnan(y):
+            min_y = y
+        if y > max_y or math.isnan(y):
+            max_y = y
+    
+    return min_x, max_x, min_y, max_y
 
 
 class QualityValidator:
@@ -25,6 +127,10 @@ class QualityValidator:
     Validates quality of face detection and image conditions
     """
     
+    # Sub-results of validate_complete, in reporting order
+    _VALIDATION_KEYS = ('image_validation', 'detection_validation',
+                        'landmark_validation', 'visibility_validation')
+    
     def __init__(self):
         """Initialize quality validator"""
         self.quality_thresholds = FACE_DETECTION_QUALITY
@@ -63,8 +169,11 @@ class QualityValidator:
         if width < 320 or height < 240:
             results['warnings'].append("Low resolution image (minimum 320x240 recommended)")
         
-        # Check lighting
-        brightness, lighting_quality = check_lighting_quality(image)
+        # Convert once; both the lighting and blur checks work on gray
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        
+        # Check lighting (mean brightness is stable on a strided sample)
+        brightness, lighting_quality = check_lighting_quality(gray, stride=4)
         results['brightness'] = brightness
         results['lighting_quality'] = lighting_quality
         
@@ -73,10 +182,14 @@ class QualityValidator:
         elif brightness < 100:
             results['warnings'].append("Suboptimal lighting conditions")
         
-        # Check for blur (using Laplacian variance)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-        blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
-        results['blur_score'] = float(blur_score)
+        # Check for blur (using Laplacian variance at full resolution, since
+        # downsampling would shift the score against the fixed threshold)
+        # 8-bit input cannot overflow int16 with the default aperture, and
+        # meanStdDev gives the variance without a float64 copy of the frame
+        ddepth = cv2.CV_16S if gray.dtype == np.uint8 else cv2.CV_64F
+        _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, ddepth))
+        blur_score = float(stddev[0, 0]) ** 2
+        results['blur_score'] = blur_score
         
         if blur_score < 100:
             results['warnings'].append("Image may be blurry")
@@ -103,13 +216,7 @@ class QualityValidator:
             'reliability': 0.0
         }
         
-        # Check if face was detected
-        if not metadata.get('face_visible', False):
-            results['valid'] = False
-            results['issues'].append(ERROR_MESSAGES['no_face'])
-            return False, results
-        
-        # Check number of faces
+        # Check if a face was detected, and how many
         num_faces = metadata.get('num_faces', 0)
         if num_faces == 0:
             results['valid'] = False
@@ -127,8 +234,9 @@ class QualityValidator:
         elif quality_score < self.quality_thresholds['good']:
             results['warnings'].append("Face detection quality is fair, results may vary")
         
-        # Check detection confidence
-        confidence = metadata.get('detection_confidence', 0.0)
+        # Check detection confidence (estimated from the quality score, since
+        # MediaPipe does not report one)
+        confidence = quality_score
         results['confidence_level'] = self._get_confidence_level(confidence)
         
         if confidence < self.confidence_thresholds['low']:
@@ -169,35 +277,39 @@ class QualityValidator:
             results['issues'].append("No landmarks provided")
             return False, results
         
-        # Check landmark count
+        # Check landmark shape and count
+        landmarks = np.asarray(landmarks)
+        if not _has_landmark_shape(landmarks):
+            results['valid'] = False
+            results['issues'].append(f"Invalid landmark shape: {landmarks.shape} (expected (468, 3))")
+            return False, results
+        
         if len(landmarks) != 468:
             results['valid'] = False
             results['issues'].append(f"Invalid landmark count: {len(landmarks)} (expected 468)")
             return False, results
         
+        # NaN/Inf, range, completeness and z-variance in one pass
+        (has_invalid, x_in_range, y_in_range,
+         valid_x, valid_y, z_variance) = _scan_landmarks(_kernel_input(landmarks))
+        
         # Check for NaN or infinite values
-        if np.any(np.isnan(landmarks)) or np.any(np.isinf(landmarks)):
+        if has_invalid:
             results['valid'] = False
             results['issues'].append("Invalid landmark values detected")
             return False, results
         
         # Check if landmarks are within valid range [0, 1] for x and y
-        x_in_range = np.all((landmarks[:, 0] >= -0.1) & (landmarks[:, 0] <= 1.1))
-        y_in_range = np.all((landmarks[:, 1] >= -0.1) & (landmarks[:, 1] <= 1.1))
-        
         if not (x_in_range and y_in_range):
             results['warnings'].append("Some landmarks are outside expected range")
         
         # Calculate completeness (percentage of landmarks within normal range)
-        valid_x = np.sum((landmarks[:, 0] >= 0) & (landmarks[:, 0] <= 1))
-        valid_y = np.sum((landmarks[:, 1] >= 0) & (landmarks[:, 1] <= 1))
-        results['completeness'] = float(min(valid_x, valid_y) / len(landmarks))
+        results['completeness'] = min(valid_x, valid_y) / len(landmarks)
         
         if results['completeness'] < 0.90:
             results['warnings'].append(f"Only {results['completeness']*100:.1f}% of landmarks are valid")
         
         # Calculate stability (low z-variance indicates stable detection)
-        z_variance = np.var(landmarks[:, 2])
         results['stability'] = float(max(0, 1.0 - z_variance * 10))
         
         if results['stability'] < 0.6:
@@ -226,8 +338,7 @@ class QualityValidator:
         }
         
         # Check face position
-        min_x, max_x = np.min(landmarks[:, 0]), np.max(landmarks[:, 0])
-        min_y, max_y = np.min(landmarks[:, 1]), np.max(landmarks[:, 1])
+        min_x, max_x, min_y, max_y = _bbox_xy(_kernel_input(landmarks))
         
         # Check if face is too close to edges
         margin = 0.02
@@ -317,18 +428,23 @@ class QualityValidator:
             landmark_valid, landmark_results = self.validate_landmarks(landmarks)
             comprehensive_results['landmark_validation'] = landmark_results
             
-            # Validate visibility
-            visibility_valid, visibility_results = self.validate_face_visibility(landmarks)
-            comprehensive_results['visibility_validation'] = visibility_results
+            # Validate visibility (needs (N, 3) landmarks; a bad shape is
+            # already reported by validate_landmarks)
+            if _has_landmark_shape(np.asarray(landmarks)):
+                visibility_valid, visibility_results = self.validate_face_visibility(landmarks)
+                comprehensive_results['visibility_validation'] = visibility_results
+            else:
+                visibility_valid = False
         else:
             landmark_valid = False
             visibility_valid = False
         
-        # Collect all issues and warnings
-        for key in ['image_validation', 'detection_validation', 'landmark_validation', 'visibility_validation']:
-            if key in comprehensive_results and comprehensive_results[key]:
-                comprehensive_results['all_issues'].extend(comprehensive_results[key].get('issues', []))
-                comprehensive_results['all_warnings'].extend(comprehensive_results[key].get('warnings', []))
+        # Collect all issues and warnings (skipped validations stay empty dicts)
+        parts = [comprehensive_results[key] for key in self._VALIDATION_KEYS]
+        comprehensive_results['all_issues'] = list(
+            chain.from_iterable(part.get('issues', ()) for part in parts))
+        comprehensive_results['all_warnings'] = list(
+            chain.from_iterable(part.get('warnings', ()) for part in parts))
         
         # Determine overall validity
         comprehensive_results['overall_valid'] = (
@@ -352,20 +468,8 @@ class QualityValidator:
     
     def _get_quality_level(self, score: float) -> str:
         """Get quality level from score"""
-        if score >= self.quality_thresholds['excellent']:
-            return "Excellent"
-        elif score >= self.quality_thresholds['good']:
-            return "Good"
-        elif score >= self.quality_thresholds['fair']:
-            return "Fair"
-        else:
-            return "Poor"
+        return classify_quality(score)
     
     def _get_confidence_level(self, score: float) -> str:
         """Get confidence level from score"""
-        if score >= self.confidence_thresholds['high']:
-            return "High"
-        elif score >= self.confidence_thresholds['medium']:
-            return "Medium"
-        else:
-            return "Low"
+        return classify_confidence(score)
@@ -2,13 +2,38 @@
 Utility functions for Pain Detection System
 """
 
+import math
 import numpy as np
 import cv2
+from functools import lru_cache
 from typing import Tuple, List, Optional
 import json
 from pathlib import Path
 from datetime import datetime
 
+# config lives in the project root, which entry points put on sys.path
+from config import TEMPORAL_DTYPE
+
+# Numba is optional: without it, @njit-decorated kernels run as plain Python
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit (supports @njit and @njit(...))"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# orjson is optional: it only speeds up save_json(compact=True)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 def calculate_distance(point1: np.ndarray, point2: np.ndarray) -> float:
     """
@@ -21,7 +46,9 @@ def calculate_distance(point1: np.ndarray, point2: np.ndarray) -> float:
     Returns:
         float: Distance between points
     """
-    return np.linalg.norm(point1 - point2)
+    # On 2-3 elements numpy dispatch dominates; math.dist on plain floats
+    # is cheaper than any array or jitted call here
+    return math.dist(point1.tolist(), point2.tolist())
 
 
 def calculate_angle(point1: np.ndarray, point2: np.ndarray, point3: np.ndarray) -> float:
@@ -36,55 +63,167 @@ def calculate_angle(point1: np.ndarray, point2: np.ndarray, point3: np.ndarray)
     Returns:
         float: Angle in degrees
     """
+    if len(point1) == 2:
+        (ax, ay), (vx, vy), (cx, cy) = point1, point2, point3
+        return angle3(ax, ay, 0.0, vx, vy, 0.0, cx, cy, 0.0)
+    (ax, ay, az), (vx, vy, vz), (cx, cy, cz) = point1, point2, point3
+    return angle3(ax, ay, az, vx, vy, vz, cx, cy, cz)
+
+
+@njit(cache=True, error_model="numpy")
+def ieee_div(num: float, den: float) -> float:
+    """
+    num / den with numpy's result for a zero divisor
+    
+    Compiled kernels (error_model="numpy") already divide this way, but the
+    plain-Python fallback would raise ZeroDivisionError; this gives +-inf,
+    or NaN for 0/0 and NaN/0, on both paths.
+    
+    Returns:
+        float: Quotient
+    """
+    if den == 0.0:
+        if num == 0.0 or num != num:
+            return math.nan
+        return math.copysign(math.inf, num) * math.copysign(1.0, den)
+    return num / den
+
+
+@njit(cache=True, fastmath=True)
+def dist3(ax: float, ay: float, az: float, bx: float, by: float, bz: float) -> float:
+    """
+    Euclidean distance between two 3D points given as scalars
+    
+    Scalar form of calculate_distance for hot paths; avoids the temporary
+    arrays and numpy dispatch of np.linalg.norm on 3 elements.
+    
+    Returns:
+        float: Distance between (ax, ay, az) and (bx, by, bz)
+    """
+    dx = ax - bx
+    dy = ay - by
+    dz = az - bz
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+
+@njit(cache=True, error_model="numpy")
+def angle3(ax: float, ay: float, az: float,
+           vx: float, vy: float, vz: float,
+           cx: float, cy: float, cz: float) -> float:
+    """
+    Angle in degrees at vertex v formed by points a and c, given as scalars
+    
+    Scalar form of calculate_angle; a zero-length side gives NaN (via
+    ieee_div) with or without Numba.
+    
+    Returns:
+        float: Angle in degrees
+    """
+    x1, y1, z1 = ax - vx, ay - vy, az - vz
+    x2, y2, z2 = cx - vx, cy - vy, cz - vz
+    norms = (x1 * x1 + y1 * y1 + z1 * z1) ** 0.5 * (x2 * x2 + y2 * y2 + z2 * z2) ** 0.5
+    cos_angle = ieee_div(x1 * x2 + y1 * y2 + z1 * z2, norms)
+    cos_angle = min(max(cos_angle, -1.0), 1.0)  # Handle numerical errors
+    return math.degrees(math.acos(cos_angle))
+
+
+def _row_norms(vectors: np.ndarray) -> np.ndarray:
+    """Euclidean norms along the last axis (einsum skips norm's squared temporary)"""
+    return np.sqrt(np.einsum('...i,...i->...', vectors, vectors))
+
+
+def pair_distances(landmarks: np.ndarray, idx_a: np.ndarray, idx_b: np.ndarray) -> np.ndarray:
+    """
+    Euclidean distances for many landmark pairs in one vectorized call
+    
+    Args:
+        landmarks: Landmark array (468, 3), or (N, 468, 3) for a batch
+        idx_a: First landmark index of each pair, shape (K,)
+        idx_b: Second landmark index of each pair, shape (K,)
+    
+    Returns:
+        np.ndarray: Distances, shape (K,) (or (N, K) for a batch)
+    """
+    return _row_norms(landmarks[..., idx_a, :] - landmarks[..., idx_b, :])
+
+
+def angles_batch(point1: np.ndarray, point2: np.ndarray, point3: np.ndarray) -> np.ndarray:
+    """
+    Angles at point2 for many point triplets in one vectorized call
+    
+    Args:
+        point1: First points, shape (..., 3)
+        point2: Vertex points, shape (..., 3)
+        point3: Third points, shape (..., 3)
+    
+    Returns:
+        np.ndarray: Angles in degrees, shape (...)
+    """
     vector1 = point1 - point2
     vector2 = point3 - point2
     
-    cos_angle = np.dot(vector1, vector2) / (np.linalg.norm(vector1) * np.linalg.norm(vector2))
+    cos_angle = np.einsum('...i,...i->...', vector1, vector2) / (
+        _row_norms(vector1) * _row_norms(vector2))
     cos_angle = np.clip(cos_angle, -1.0, 1.0)  # Handle numerical errors
     
-    angle = np.arccos(cos_angle)
-    return np.degrees(angle)
+    return np.degrees(np.arccos(cos_angle))
 
 
-def normalize_landmarks(landmarks: np.ndarray, image_shape: Tuple[int, int]) -> np.ndarray:
+def triplet_angles(landmarks: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    Angles for many landmark triplets in one vectorized call
+    
+    Args:
+        landmarks: Landmark array (468, 3), or (N, 468, 3) for a batch
+        idx: Index triplets, shape (K, 3); the middle index is the vertex
+    
+    Returns:
+        np.ndarray: Angles in degrees, shape (K,) (or (N, K) for a batch)
+    """
+    pts = landmarks[..., idx, :]
+    return angles_batch(pts[..., 0, :], pts[..., 1, :], pts[..., 2, :])
+
+
+def _xy_scale(landmarks: np.ndarray, image_shape: Tuple[int, int]) -> np.ndarray:
+    """Per-column (width, height, 1...) factors in the landmarks' dtype"""
+    height, width = image_shape
+    scale = np.ones(landmarks.shape[-1], dtype=landmarks.dtype)
+    scale[0] = width
+    scale[1] = height
+    return scale
+
+
+def normalize_landmarks(landmarks: np.ndarray, image_shape: Tuple[int, int],
+                        out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Normalize landmarks to 0-1 range based on image dimensions
     
     Args:
         landmarks: Array of landmarks (N, 3) with x, y, z coordinates
         image_shape: (height, width) of the image
+        out: Optional array to write into (may be landmarks itself)
     
     Returns:
         np.ndarray: Normalized landmarks
     """
-    normalized = landmarks.copy()
-    height, width = image_shape
-    
-    normalized[:, 0] /= width   # Normalize x
-    normalized[:, 1] /= height  # Normalize y
-    # z is already normalized by MediaPipe
-    
-    return normalized
+    # z is already normalized by MediaPipe, so its factor is 1
+    return np.divide(landmarks, _xy_scale(landmarks, image_shape), out=out)
 
 
-def denormalize_landmarks(landmarks: np.ndarray, image_shape: Tuple[int, int]) -> np.ndarray:
+def denormalize_landmarks(landmarks: np.ndarray, image_shape: Tuple[int, int],
+                          out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Convert normalized landmarks back to pixel coordinates
     
     Args:
         landmarks: Normalized landmarks (N, 3)
         image_shape: (height, width) of the image
+        out: Optional array to write into (may be landmarks itself)
     
     Returns:
         np.ndarray: Denormalized landmarks in pixel coordinates
     """
-    denormalized = landmarks.copy()
-    height, width = image_shape
-    
-    denormalized[:, 0] *= width
-    denormalized[:, 1] *= height
-    
-    return denormalized
+    return np.multiply(landmarks, _xy_scale(landmarks, image_shape), out=out)
 
 
 def calculate_center(points: np.ndarray) -> np.ndarray:
@@ -100,16 +239,21 @@ def calculate_center(points: np.ndarray) -> np.ndarray:
     return np.mean(points, axis=0)
 
 
-def check_lighting_quality(image: np.ndarray) -> Tuple[float, str]:
+def check_lighting_quality(image: np.ndarray, stride: int = 1) -> Tuple[float, str]:
     """
     Assess image lighting quality
     
     Args:
         image: Input image (BGR or grayscale)
+        stride: Sample every stride-th row and column (brightness varies
+                slowly across a frame, so 4 stays within ~1% and reads 16x less)
     
     Returns:
         Tuple[float, str]: (brightness_score, quality_description)
     """
+    if stride > 1:
+        image = np.ascontiguousarray(image[::stride, ::stride])
+    
     # Convert to grayscale if needed
     if len(image.shape) == 3:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -117,7 +261,7 @@ def check_lighting_quality(image: np.ndarray) -> Tuple[float, str]:
         gray = image
     
     # Calculate average brightness
-    brightness = np.mean(gray)
+    brightness = cv2.mean(gray)[0]
     
     # Assess quality
     if brightness < 50:
@@ -134,18 +278,43 @@ def check_lighting_quality(image: np.ndarray) -> Tuple[float, str]:
     return brightness, quality
 
 
-def save_json(data: dict, filepath: Path):
+def _json_default(obj):
+    """
+    JSON fallback for values the encoders don't handle, shared by the
+    json and orjson paths of save_json() so both write the same output
+    
+    numpy scalars become Python numbers, arrays become (nested) lists and
+    anything else is written as str(obj).
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def save_json(data: dict, filepath: Path, compact: bool = False):
     """
     Save data to JSON file
     
     Args:
-        data: Dictionary to save
+        data: Dictionary to save (numpy values are converted to lists/numbers)
         filepath: Output file path
+        compact: Skip pretty-printing for files not meant for people; uses
+                 orjson when installed
     """
     filepath.parent.mkdir(parents=True, exist_ok=True)
     
+    if compact and ORJSON_AVAILABLE:
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS))
+        return
+    
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        if compact:
+            json.dump(data, f, ensure_ascii=False, default=_json_default, separators=(',', ':'))
+            return
+        json.dump(data, f, indent=2, ensure_ascii=False, default=_json_default)
 
 
 def load_json(filepath: Path) -> dict:
@@ -189,6 +358,10 @@ def resize_image(image: np.ndarray, max_width: int = 1280, max_height: int = 720
     """
     height, width = image.shape[:2]
     
+    # Already within bounds: nothing to do (never upscale)
+    if width <= max_width and height <= max_height:
+        return image
+    
     # Calculate scaling factor
     scale_w = max_width / width
     scale_h = max_height / height
@@ -202,6 +375,20 @@ def resize_image(image: np.ndarray, max_width: int = 1280, max_height: int = 720
     return image
 
 
+@lru_cache(maxsize=128)
+def _text_size(text: str, font_scale: float, thickness: int) -> Tuple[int, int, int]:
+    """
+    Cached cv2.getTextSize for FONT_HERSHEY_SIMPLEX (labels repeat every frame)
+    
+    Returns:
+        Tuple[int, int, int]: (text_width, text_height, baseline)
+    """
+    (text_width, text_height), baseline = cv2.getTextSize(
+        text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness
+    )
+    return text_width, text_height, baseline
+
+
 def draw_text_with_background(
     image: np.ndarray,
     text: str,
@@ -231,7 +418,7 @@ def draw_text_with_background(
     font = cv2.FONT_HERSHEY_SIMPLEX
     
     # Get text size
-    (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    text_width, text_height, baseline = _text_size(text, font_scale, thickness)
     
     x, y = position
     
@@ -259,6 +446,10 @@ def draw_text_with_background(
     return image
 
 
+# Green, yellow, red (BGR) for scores below low, below medium, and above
+_SCORE_COLORS = ((0, 255, 0), (0, 255, 255), (0, 0, 255))
+
+
 def get_color_for_score(score: float, thresholds: dict) -> Tuple[int, int, int]:
     """
     Get color based on score and thresholds
@@ -270,12 +461,8 @@ def get_color_for_score(score: float, thresholds: dict) -> Tuple[int, int, int]:
     Returns:
         Tuple[int, int, int]: BGR color
     """
-    if score < thresholds['low']:
-        return (0, 255, 0)  # Green
-    elif score < thresholds['medium']:
-        return (0, 255, 255)  # Yellow
-    else:
-        return (0, 0, 255)  # Red
+    # Count the thresholds reached; 'not <' keeps NaN scores red as before
+    return _SCORE_COLORS[(not score < thresholds['low']) + (not score < thresholds['medium'])]
 
 
 def calculate_percentage(value: float, min_val: float = 0.0, max_val: float = 1.0) -> float:
@@ -308,10 +495,130 @@ def smooth_values(values: List[float], window_size: int = 5) -> List[float]:
     if len(values) < window_size:
         return values
     
-    smoothed = []
-    for i in range(len(values)):
-        start = max(0, i - window_size // 2)
-        end = min(len(values), i + window_size // 2 + 1)
-        smoothed.append(np.mean(values[start:end]))
+    # Window sums from a cumulative sum; windows are clipped at both ends
+    arr = np.asarray(values, dtype=np.float64)
+    cumsum = np.concatenate(([0.0], np.cumsum(arr)))
+    half = window_size // 2
+    positions = np.arange(len(arr))
+    start = np.maximum(positions - half, 0)
+    end = np.minimum(positions + half + 1, len(arr))
+    
+    return ((cumsum[end] - cumsum[start]) / (end - start)).tolist()
+
+
+class RingBuffer:
+    """
+    Fixed-size circular buffer of scalar samples backed by a preallocated array
+    
+    Pushing is O(1) and never allocates; once full, the oldest sample is
+    overwritten. Statistics run over the filled part of the array.
+    """
     
-    return smoothed
+    __slots__ = ("buf", "head", "count")
+    
+    def __init__(self, size: int, dtype=TEMPORAL_DTYPE):
+        """
+        Args:
+            size: Maximum number of samples kept
+            dtype: Storage dtype of the samples (config.TEMPORAL_DTYPE by default)
+        """
+        self.buf = np.zeros(size, dtype=dtype)
+        self.head = 0   # Next slot to write
+        self.count = 0  # Number of valid samples
+    
+    def push(self, value: float):
+        """Append a sample, overwriting the oldest one when full"""
+        self.buf[self.head] = value
+        self.head = (self.head + 1) % self.buf.size
+        if self.count < self.buf.size:
+            self.count += 1
+    
+    def values(self) -> np.ndarray:
+        """
+        Get samples in chronological order (oldest first)
+        
+        Returns:
+            np.ndarray: View while the buffer is filling, a copy once it wraps
+        """
+        if self.count < self.buf.size:
+            return self.buf[:self.count]
+        return np.concatenate((self.buf[self.head:], self.buf[:self.head]))
+    
+    def weighted_mean(self, weights: np.ndarray, weight_sum: float = None) -> float:
+        """
+        Weighted mean of the stored samples without reordering them
+        
+        Args:
+            weights: One weight per stored sample, in chronological order
+            weight_sum: Precomputed weights.sum() (computed when omitted)
+        
+        Returns:
+            float: sum(weights * values) / sum(weights)
+        """
+        if self.count < self.buf.size:
+            total = np.dot(self.buf[:self.count], weights)
+        else:
+            # Oldest samples start at head; split the weights to match
+            split = self.buf.size - self.head
+            total = np.dot(self.buf[self.head:], weights[:split]) + np.dot(self.buf[:self.head], weights[split:])
+        if weight_sum is None:
+            weight_sum = weights.sum()
+        return float(total / weight_sum)
+    
+    def push_smoothed(self, values: np.ndarray, weights_by_len) -> np.ndarray:
+        """
+        Push a sequence of samples, returning the weighted mean after each push
+        
+        Equivalent to calling push() then weighted_mean() per sample, but the
+        full windows are computed in one vectorized pass.
+        
+        Args:
+            values: Samples in chronological order
+            weights_by_len: weights_by_len[k] is the weight vector used when
+                            k samples are stored (k >= 2; one sample is its
+                            own mean)
+        
+        Returns:
+            np.ndarray: Smoothed value for each sample (float64)
+        """
+        size = self.buf.size
+        values = np.asarray(values, dtype=self.buf.dtype)
+        prev = self.values()
+        seq = np.concatenate((prev, values)).astype(np.float64)
+        
+        # ends[i] = number of samples seen once values[i] is pushed
+        ends = np.arange(len(prev) + 1, len(seq) + 1)
+        out = np.empty(len(values), dtype=np.float64)
+        
+        full = ends >= size
+        if full.any():
+            weights = weights_by_len[size]
+            windows = np.lib.stride_tricks.sliding_window_view(seq, size)
+            out[full] = windows[ends[full] - size] @ (weights / weights.sum())
+        for i in np.flatnonzero(~full):
+            k = ends[i]
+            out[i] = seq[0] if k == 1 else np.dot(seq[:k], weights_by_len[k]) / weights_by_len[k].sum()
+        
+        for value in values[-size:]:
+            self.push(value)
+        return out
+    
+    def mean(self) -> float:
+        """Mean of the stored samples (0.0 when empty)"""
+        if self.count == 0:
+            return 0.0
+        return float(np.mean(self.buf[:self.count]))
+    
+    def std(self) -> float:
+        """Standard deviation of the stored samples (0.0 when empty)"""
+        if self.count == 0:
+            return 0.0
+        return float(np.std(self.buf[:self.count]))
+    
+    def clear(self):
+        """Drop all samples (storage is kept)"""
+        self.head = 0
+        self.count = 0
+    
+    def __len__(self) -> int:
+        return self.count
@@ -14,7 +14,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 from src.face_detector import FaceDetector
 from src.landmark_extractor import LandmarkExtractor
 from src.quality_validator import QualityValidator
-from config import OUTPUT_DIR
+from config import get_output_dir, release_face_mesh, setup_logging, warmup_face_mesh
 
 def test_face_detection():
     """Test face detection with webcam"""
@@ -69,10 +69,11 @@ def test_face_detection():
             pain_landmarks = extractor.get_all_pain_landmarks(landmarks)
             
             # Calculate metrics
-            eyebrow_dist = extractor.calculate_eyebrow_distance(landmarks)
-            mouth_metrics = extractor.calculate_mouth_metrics(landmarks)
-            eye_aperture = extractor.calculate_eye_aperture(landmarks)
-            jaw_tension = extractor.calculate_jaw_tension(landmarks)
+            metrics = extractor.calculate_all_metrics(landmarks)
+            eyebrow_dist = metrics['eyebrow']
+            mouth_metrics = metrics['mouth']
+            eye_aperture = metrics['eye']
+            jaw_tension = metrics['jaw']
             
             # Display info
             y_offset = 30
@@ -138,7 +139,7 @@ def test_face_detection():
             break
         elif key == ord('s') and success:
             # Save annotated frame
-            output_path = OUTPUT_DIR / f"phase2_test_{frame_count}.jpg"
+            output_path = get_output_dir() / f"phase2_test_{frame_count}.jpg"
             cv2.imwrite(str(output_path), display_frame)
             print(f"   ✓ Saved frame to {output_path}")
     
@@ -216,6 +217,12 @@ if __name__ == "__main__":
     print("\nPHASE 2 - CORE MEDIAPIPE INTEGRATION")
     print("Testing face detection, landmark extraction, and validation\n")
     
+    # Detector log records also go to outputs/pain_detection.log
+    setup_logging()
+    
+    # Build the shared FaceMesh (used by FaceDetector) up front
+    warmup_face_mesh()
+    
     # Run component tests first
     run_component_tests()
     
@@ -229,4 +236,5 @@ if __name__ == "__main__":
         print("\nSkipping webcam test.")
         print("You can run this test later with: python tests/test_phase2.py")
     
+    release_face_mesh()
     print("\n✓ Phase 2 implementation complete and tested!")
@@ -3,22 +3,23 @@ Test script for Phase 3: Pain Analyzer Modules
 """
 
 import sys
+import tempfile
 from pathlib import Path
 import numpy as np
 
-# Add parent directory to path for config
+# Add parent directory to path for config and the src package
 sys.path.insert(0, str(Path(__file__).parent.parent))
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 # Import config and analyzers
 import config
-from pain_analyzers import (
+from src.pain_analyzers import (
     BrowAnalyzer,
     GrimaceAnalyzer,
     EyeAnalyzer,
     JawAnalyzer,
     NasolabialAnalyzer
 )
+from src import utils
 
 print("=" * 70)
 print("PHASE 3: PAIN ANALYZER MODULES - TEST")
@@ -162,13 +163,14 @@ try:
     analyzer = BrowAnalyzer(config.LANDMARK_INDICES)
     analyzer.set_baseline(dummy_landmarks)
     
-    # Simulate multiple frames
-    scores = []
-    for i in range(15):
-        # Slightly modify landmarks to simulate movement
-        modified_landmarks = dummy_landmarks + np.random.randn(468, 3) * 0.01
-        result = analyzer.analyze(modified_landmarks, use_baseline=True)
-        scores.append(result['smoothed_score'])
+    # Simulate multiple frames, slightly modified to simulate movement,
+    # and analyze them as one batch (seeded float32 noise, one draw)
+    rng = np.random.default_rng(0)
+    noise = rng.standard_normal((15, 468, 3), dtype=np.float32)
+    noise *= 0.01
+    modified_landmarks = dummy_landmarks.astype(np.float32) + noise
+    result = analyzer.analyze_batch(modified_landmarks, use_baseline=True)
+    scores = result['smoothed_score'].tolist()
     
     print(f"✓ Processed 15 frames")
     print(f"  - Score range: {min(scores):.3f} to {max(scores):.3f}")
@@ -189,12 +191,12 @@ print()
 print("7. Testing Integrated Multi-Analyzer System")
 print("-" * 70)
 try:
-    # Create all analyzers
+    # Create all analyzers, keyed like config.PAIN_INDICATOR_ORDER
     analyzers = {
-        'brow': BrowAnalyzer(config.LANDMARK_INDICES),
+        'brow_tension': BrowAnalyzer(config.LANDMARK_INDICES),
         'grimace': GrimaceAnalyzer(config.LANDMARK_INDICES),
-        'eye': EyeAnalyzer(config.LANDMARK_INDICES),
-        'jaw': JawAnalyzer(config.LANDMARK_INDICES),
+        'eye_squint': EyeAnalyzer(config.LANDMARK_INDICES),
+        'jaw_clench': JawAnalyzer(config.LANDMARK_INDICES),
         'nasolabial': NasolabialAnalyzer(config.LANDMARK_INDICES)
     }
     
@@ -207,13 +209,13 @@ try:
     # Run analysis with all
     results = {}
     for name, analyzer in analyzers.items():
-        if name == 'brow':
+        if name == 'brow_tension':
             results[name] = analyzer.analyze(dummy_landmarks)['smoothed_percentage']
         elif name == 'grimace':
             results[name] = analyzer.analyze(dummy_landmarks)['smoothed_percentage']
-        elif name == 'eye':
+        elif name == 'eye_squint':
             results[name] = analyzer.analyze(dummy_landmarks)['smoothed_percentage']
-        elif name == 'jaw':
+        elif name == 'jaw_clench':
             results[name] = analyzer.analyze(dummy_landmarks)['smoothed_percentage']
         elif name == 'nasolabial':
             results[name] = analyzer.analyze(dummy_landmarks)['smoothed_percentage']
@@ -221,16 +223,11 @@ try:
     print("✓ All analyzers executed")
     print("\n  Individual Scores:")
     for name, score in results.items():
-        print(f"    - {name.capitalize()}: {score:.1f}%")
+        print(f"    - {name.replace('_', ' ').capitalize()}: {score:.1f}%")
     
-    # Calculate weighted pain score
-    weighted_score = (
-        results['brow'] * config.PAIN_WEIGHTS['brow_tension'] +
-        results['grimace'] * config.PAIN_WEIGHTS['grimace'] +
-        results['eye'] * config.PAIN_WEIGHTS['eye_squint'] +
-        results['jaw'] * config.PAIN_WEIGHTS['jaw_clench'] +
-        results['nasolabial'] * config.PAIN_WEIGHTS['nasolabial']
-    ) / 10.0  # Convert to 0-10 scale
+    # Calculate weighted pain score in the order of PAIN_WEIGHTS_VEC
+    percentages = np.array([results[name] for name in config.PAIN_INDICATOR_ORDER])
+    weighted_score = float(percentages @ config.PAIN_WEIGHTS_VEC) / 10.0  # Convert to 0-10 scale
     
     print(f"\n  Weighted Pain Score: {weighted_score:.2f}/10")
     
@@ -238,6 +235,78 @@ try:
 except Exception as e:
     print(f"✗ Integrated System: FAILED - {e}")
 
+print()
+
+# Test 8: Saving Results as JSON
+print("8. Testing JSON Round-Trip of Analysis Results")
+print("-" * 70)
+try:
+    # Analyzer output mixes Python and numpy values
+    data = {
+        'score': np.float32(0.25),
+        'frames': np.int64(15),
+        'baseline_set': np.bool_(True),
+        'smoothed': np.array([0.5, 0.75], dtype=np.float32),
+        'indicators': {'brow': np.float64(12.5), 'landmarks': np.zeros((2, 2))},
+    }
+    expected = {
+        'score': 0.25,
+        'frames': 15,
+        'baseline_set': True,
+        'smoothed': [0.5, 0.75],
+        'indicators': {'brow': 12.5, 'landmarks': [[0.0, 0.0], [0.0, 0.0]]},
+    }
+    
+    # Pretty json, compact json and (if installed) compact orjson
+    # must all read back the same
+    with tempfile.TemporaryDirectory() as tmp:
+        for compact, use_orjson in ((False, False), (True, False), (True, utils.ORJSON_AVAILABLE)):
+            saved_flag = utils.ORJSON_AVAILABLE
+            utils.ORJSON_AVAILABLE = use_orjson
+            try:
+                path = Path(tmp) / f"result_{compact}_{use_orjson}.json"
+                utils.save_json(data, path, compact=compact)
+            finally:
+                utils.ORJSON_AVAILABLE = saved_flag
+            loaded = utils.load_json(path)
+            if loaded != expected:
+                raise AssertionError(f"compact={compact}, orjson={use_orjson}: {loaded}")
+    
+    print(f"✓ Round-trip matches (orjson {'used' if utils.ORJSON_AVAILABLE else 'not installed'})")
+    print("✓ JSON Round-Trip: PASSED")
+except Exception as e:
+    print(f"✗ JSON Round-Trip: FAILED - {e}")
+
+print()
+
+# Test 9: Level Classification
+print("9. Testing Pain/Confidence/Quality Level Classification")
+print("-" * 70)
+try:
+    cases = [
+        (config.classify_pain, 1.0, 'low'),
+        (config.classify_pain, 4.5, 'medium'),
+        (config.classify_pain, 8.0, 'high'),
+        (config.classify_confidence, 0.95, config.CONFIDENCE_LABELS[-1]),
+        (config.classify_quality, 0.95, config.QUALITY_LABELS[-1]),
+    ]
+    # Degenerate landmarks give NaN scores; they must never read as the top level
+    for classify, labels in ((config.classify_pain, config.PAIN_LABELS),
+                             (config.classify_confidence, config.CONFIDENCE_LABELS),
+                             (config.classify_quality, config.QUALITY_LABELS)):
+        for bad in (float('nan'), np.float32('nan'), float('inf'), -float('inf')):
+            cases.append((classify, bad, labels[0]))
+    
+    for classify, score, expected in cases:
+        label = classify(score)
+        if label != expected:
+            raise AssertionError(f"{classify.__name__}({score}) = {label!r}, expected {expected!r}")
+    
+    print(f"✓ {len(cases)} scores classified (non-finite -> lowest level)")
+    print("✓ Level Classification: PASSED")
+except Exception as e:
+    print(f"✗ Level Classification: FAILED - {e}")
+
 print()
 print("=" * 70)
 print("PHASE 3 TEST SUMMARY")
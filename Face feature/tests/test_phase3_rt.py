@@ -6,8 +6,11 @@ Tests Phase 3 analyzers with live webcam feed
 import cv2
 import mediapipe as mp
 import numpy as np
+import queue
 import sys
 import os
+import threading
+import time
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -17,23 +20,58 @@ from src.pain_analyzers import (
     GrimaceAnalyzer,
     EyeAnalyzer,
     JawAnalyzer,
-    NasolabialAnalyzer
+    NasolabialAnalyzer,
+    LandmarkView
+)
+from src.utils import resize_image
+from config import (
+    COLORS,
+    LANDMARK_INDICES,
+    MAX_PROCESS_SIDE,
+    PAIN_WEIGHTS_VEC,
+    classify_pain,
+    get_face_mesh,
+    release_face_mesh,
+    setup_logging,
+    warmup_face_mesh
 )
-from config import LANDMARK_INDICES
 
 # Initialize MediaPipe Face Mesh
 mp_face_mesh = mp.solutions.face_mesh
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
+# Display color and text for each pain level from classify_pain
+PAIN_LEVEL_STYLES = {
+    'low': (COLORS['green'], "LOW"),
+    'medium': (COLORS['yellow'], "MODERATE"),
+    'high': (COLORS['red'], "HIGH"),
+}
+
+# Queued by the capture thread when the camera stops delivering frames
+_END_OF_STREAM = object()
+
+# Consecutive failed reads (READ_RETRY_DELAY apart) before giving up
+MAX_READ_FAILURES = 50
+READ_RETRY_DELAY = 0.02
+
+
+def _put_latest(frames, item):
+    """Queue item, dropping the oldest queued entry if the queue is full"""
+    try:
+        frames.put_nowait(item)
+    except queue.Full:
+        try:
+            frames.get_nowait()
+        except queue.Empty:
+            pass
+        frames.put_nowait(item)
+
 class RealtimePainDetector:
     def __init__(self):
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        # Build the shared FaceMesh (seconds) on a thread while the
+        # analyzers are set up
+        warmup = warmup_face_mesh(background=True)
         
         # Initialize all analyzers with landmark indices from config
         self.brow_analyzer = BrowAnalyzer(LANDMARK_INDICES)
@@ -42,6 +80,22 @@ class RealtimePainDetector:
         self.jaw_analyzer = JawAnalyzer(LANDMARK_INDICES)
         self.nasolabial_analyzer = NasolabialAnalyzer(LANDMARK_INDICES)
         
+        # One landmark gather per frame shared by all analyzers
+        self.landmark_view = LandmarkView({
+            'brow': self.brow_analyzer,
+            'grimace': self.grimace_analyzer,
+            'eye': self.eye_analyzer,
+            'jaw': self.jaw_analyzer,
+            'nasolabial': self.nasolabial_analyzer,
+        })
+        
+        # Shared FaceMesh configured from MEDIAPIPE_CONFIG
+        warmup.join()
+        self.face_mesh = get_face_mesh()
+        
+        # RGB frame buffer reused across frames (reallocated on size change)
+        self._rgb_scratch = None
+        
         self.baseline_set = False
         
     def extract_landmarks(self, results, image_shape):
@@ -52,19 +106,17 @@ class RealtimePainDetector:
         landmarks = results.multi_face_landmarks[0]
         h, w = image_shape[:2]
         
-        landmark_array = []
-        for lm in landmarks.landmark:
-            landmark_array.append([lm.x * w, lm.y * h, lm.z * w])
-            
-        return np.array(landmark_array)
+        # One bulk float32 conversion, then scale to pixels in place
+        # (z uses the width, like x)
+        landmark_array = np.array(
+            [(lm.x, lm.y, lm.z) for lm in landmarks.landmark], dtype=np.float32
+        )
+        landmark_array *= np.array([w, h, w], dtype=np.float32)
+        return landmark_array
     
     def calibrate_baseline(self, landmarks):
         """Set baseline for all analyzers"""
-        self.brow_analyzer.set_baseline(landmarks)
-        self.grimace_analyzer.set_baseline(landmarks)
-        self.eye_analyzer.set_baseline(landmarks)
-        self.jaw_analyzer.set_baseline(landmarks)
-        self.nasolabial_analyzer.set_baseline(landmarks)
+        self.landmark_view.set_baseline(landmarks)
         self.baseline_set = True
         print("✓ Baseline calibrated!")
     
@@ -80,35 +132,21 @@ class RealtimePainDetector:
     
     def analyze_pain(self, landmarks):
         """Analyze pain indicators"""
-        brow_result = self.brow_analyzer.analyze(landmarks)
-        grimace_result = self.grimace_analyzer.analyze(landmarks)
-        eye_result = self.eye_analyzer.analyze(landmarks)
-        jaw_result = self.jaw_analyzer.analyze(landmarks)
-        nasolabial_result = self.nasolabial_analyzer.analyze(landmarks)
+        # Smoothed indicator scores, ordered as PAIN_INDICATOR_ORDER. All five
+        # analyzers are measured and scored in one compiled fused_scores call
+        # (compiled, or loaded from the numba cache, when LandmarkView is built)
+        scores = self.landmark_view.smoothed_scores(landmarks)
+        percentages = (scores * 100).tolist()
         
         # Calculate weighted pain score (0-10)
-        weights = {
-            'brow': 0.25,
-            'grimace': 0.30,
-            'eye': 0.20,
-            'jaw': 0.20,
-            'nasolabial': 0.05
-        }
-        
-        overall_score = (
-            brow_result['smoothed_score'] * weights['brow'] +
-            grimace_result['smoothed_score'] * weights['grimace'] +
-            eye_result['smoothed_score'] * weights['eye'] +
-            jaw_result['smoothed_score'] * weights['jaw'] +
-            nasolabial_result['smoothed_score'] * weights['nasolabial']
-        ) * 10
+        overall_score = float(np.dot(scores, PAIN_WEIGHTS_VEC)) * 10
         
         return {
-            'brow': {'percentage': brow_result['smoothed_percentage']},
-            'grimace': {'percentage': grimace_result['smoothed_percentage']},
-            'eye': {'percentage': eye_result['smoothed_percentage']},
-            'jaw': {'percentage': jaw_result['smoothed_percentage']},
-            'nasolabial': {'percentage': nasolabial_result['smoothed_percentage']},
+            'brow': {'percentage': percentages[0]},
+            'grimace': {'percentage': percentages[1]},
+            'eye': {'percentage': percentages[2]},
+            'jaw': {'percentage': percentages[3]},
+            'nasolabial': {'percentage': percentages[4]},
             'overall_score': overall_score
         }
     
@@ -116,10 +154,10 @@ class RealtimePainDetector:
         """Draw pain scores on image"""
         h, w = image.shape[:2]
         
-        # Background for text
-        overlay = image.copy()
-        cv2.rectangle(overlay, (10, 10), (400, 280), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, image, 0.4, 0, image)
+        # Background for text: a 60% black panel over (10, 10)-(400, 280),
+        # i.e. the panel region darkened to 40% in place (no frame copy)
+        panel = image[10:281, 10:401]
+        cv2.addWeighted(panel, 0.4, panel, 0, 0, dst=panel)
         
         y_offset = 40
         
@@ -154,15 +192,7 @@ class RealtimePainDetector:
             
             # Overall pain score with color coding
             score = results_dict['overall_score']
-            if score < 3:
-                color = (0, 255, 0)  # Green
-                level = "LOW"
-            elif score < 6:
-                color = (0, 255, 255)  # Yellow
-                level = "MODERATE"
-            else:
-                color = (0, 0, 255)  # Red
-                level = "HIGH"
+            color, level = PAIN_LEVEL_STYLES[classify_pain(score)]
             
             cv2.putText(image, f"Pain Score: {score:.1f}/10", (20, y_offset),
                        cv2.FONT_HERSHEY_DUPLEX, 0.7, color, 2)
@@ -173,8 +203,56 @@ class RealtimePainDetector:
         cv2.putText(image, "Controls: C=Calibrate | R=Reset | S=Save | Q=Quit",
                    (10, h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
     
+    def _capture_loop(self, cap, frames, stop):
+        """
+        Producer thread: capture, flip, convert and run MediaPipe
+        
+        Pushes (image, results, landmarks) to frames. MediaPipe releases the
+        GIL while it runs, so this overlaps with analysis and drawing on the
+        main thread. When the consumer falls behind, the oldest queued frame
+        is dropped so the display stays live.
+        
+        Ends by queueing _END_OF_STREAM once the camera stops delivering
+        frames, or the exception if capture fails, so run() never waits on
+        a dead producer.
+        """
+        failures = 0
+        try:
+            while not stop.is_set():
+                success, image = cap.read()
+                if not success:
+                    failures += 1
+                    if failures >= MAX_READ_FAILURES or not cap.isOpened():
+                        print("❌ Failed to capture frame, stopping")
+                        break
+                    time.sleep(READ_RETRY_DELAY)
+                    continue
+                failures = 0
+                
+                # Flip image for selfie view, in place (read() gave a fresh frame)
+                cv2.flip(image, 1, dst=image)
+                
+                # Face Mesh works at low resolution internally, so shrink large
+                # frames first; landmarks are normalized and scaled to image.shape
+                small = resize_image(image, MAX_PROCESS_SIDE, MAX_PROCESS_SIDE)
+                
+                # Convert to RGB into the reused buffer
+                if self._rgb_scratch is None or self._rgb_scratch.shape != small.shape:
+                    self._rgb_scratch = np.empty_like(small)
+                cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb_scratch)
+                
+                # Process face mesh
+                results = self.face_mesh.process(self._rgb_scratch)
+                landmarks = self.extract_landmarks(results, image.shape)
+                
+                _put_latest(frames, (image, results, landmarks))
+        except Exception as exc:
+            _put_latest(frames, exc)
+            return
+        _put_latest(frames, _END_OF_STREAM)
+    
     def run(self):
-        """Main loop"""
+        """Main loop (analysis and display; capture runs on its own thread)"""
         cap = cv2.VideoCapture(0)
         
         if not cap.isOpened():
@@ -193,84 +271,92 @@ class RealtimePainDetector:
         
         frame_count = 0
         
-        while cap.isOpened():
-            success, image = cap.read()
-            if not success:
-                print("❌ Failed to capture frame")
-                continue
-            
-            # Flip image for selfie view
-            image = cv2.flip(image, 1)
-            
-            # Convert to RGB
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Process face mesh
-            results = self.face_mesh.process(image_rgb)
-            
-            results_dict = None
-            
-            if results.multi_face_landmarks:
-                # Draw face mesh
-                for face_landmarks in results.multi_face_landmarks:
-                    mp_drawing.draw_landmarks(
-                        image=image,
-                        landmark_list=face_landmarks,
-                        connections=mp_face_mesh.FACEMESH_TESSELATION,
-                        landmark_drawing_spec=None,
-                        connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style()
-                    )
-                    mp_drawing.draw_landmarks(
-                        image=image,
-                        landmark_list=face_landmarks,
-                        connections=mp_face_mesh.FACEMESH_CONTOURS,
-                        landmark_drawing_spec=None,
-                        connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_contours_style()
-                    )
+        # At most two frames in flight so latency cannot build up
+        frames = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        capture = threading.Thread(target=self._capture_loop, args=(cap, frames, stop),
+                                   name="capture", daemon=True)
+        capture.start()
+        
+        try:
+            while True:
+                try:
+                    item = frames.get(timeout=1.0)
+                except queue.Empty:
+                    # Keep the window responsive (and Q working) while waiting
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        print("\n✓ Exiting...")
+                        break
+                    continue
                 
-                # Extract landmarks
-                landmarks = self.extract_landmarks(results, image.shape)
+                if item is _END_OF_STREAM:
+                    print("\n⚠ Camera stream ended")
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                image, results, landmarks = item
+                
+                results_dict = None
                 
-                if landmarks is not None:
-                    # Analyze pain
-                    results_dict = self.analyze_pain(landmarks)
-            
-            # Draw info overlay
-            self.draw_info(image, results_dict)
-            
-            # Show image
-            cv2.imshow('Pain Detection - Phase 3 Test', image)
-            
-            # Handle key presses
-            key = cv2.waitKey(5) & 0xFF
-            
-            if key == ord('q'):
-                print("\n✓ Exiting...")
-                break
-            elif key == ord('c'):
                 if results.multi_face_landmarks:
-                    landmarks = self.extract_landmarks(results, image.shape)
+                    # Draw face mesh
+                    for face_landmarks in results.multi_face_landmarks:
+                        mp_drawing.draw_landmarks(
+                            image=image,
+                            landmark_list=face_landmarks,
+                            connections=mp_face_mesh.FACEMESH_TESSELATION,
+                            landmark_drawing_spec=None,
+                            connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style()
+                        )
+                        mp_drawing.draw_landmarks(
+                            image=image,
+                            landmark_list=face_landmarks,
+                            connections=mp_face_mesh.FACEMESH_CONTOURS,
+                            landmark_drawing_spec=None,
+                            connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_contours_style()
+                        )
+                
+                    if landmarks is not None:
+                        # Analyze pain
+                        results_dict = self.analyze_pain(landmarks)
+                
+                # Draw info overlay
+                self.draw_info(image, results_dict)
+                
+                # Show image
+                cv2.imshow('Pain Detection - Phase 3 Test', image)
+                
+                # Handle key presses
+                key = cv2.waitKey(5) & 0xFF
+                
+                if key == ord('q'):
+                    print("\n✓ Exiting...")
+                    break
+                elif key == ord('c'):
                     if landmarks is not None:
                         self.calibrate_baseline(landmarks)
-                else:
-                    print("⚠ No face detected! Cannot calibrate.")
-            elif key == ord('r'):
-                self.reset_baseline()
-            elif key == ord('s'):
-                if results_dict:
-                    filename = f"outputs/pain_analysis_{frame_count}.jpg"
-                    cv2.imwrite(filename, image)
-                    print(f"✓ Saved: {filename}")
-                    print(f"  Pain Score: {results_dict['overall_score']:.1f}/10")
-                else:
-                    print("⚠ No face detected! Cannot save.")
-            
-            frame_count += 1
-        
-        cap.release()
-        cv2.destroyAllWindows()
-        self.face_mesh.close()
+                    else:
+                        print("⚠ No face detected! Cannot calibrate.")
+                elif key == ord('r'):
+                    self.reset_baseline()
+                elif key == ord('s'):
+                    if results_dict:
+                        filename = f"outputs/pain_analysis_{frame_count}.jpg"
+                        cv2.imwrite(filename, image)
+                        print(f"✓ Saved: {filename}")
+                        print(f"  Pain Score: {results_dict['overall_score']:.1f}/10")
+                    else:
+                        print("⚠ No face detected! Cannot save.")
+                
+                frame_count += 1
+        finally:
+            stop.set()
+            capture.join()
+            cap.release()
+            cv2.destroyAllWindows()
+            release_face_mesh()
 
 if __name__ == "__main__":
+    setup_logging()
     detector = RealtimePainDetector()
     detector.run()
\ No newline at end of file
@@ -84,6 +84,22 @@ for file_path, description in config_files.items():
         print(f"✗ {description:30} - MISSING")
         all_files_exist = False
 
+print()
+
+# Numba is optional; without it the kernels run as plain Python
+print("Precompiling Scoring Kernels:")
+print("-" * 70)
+
+try:
+    sys.path.insert(0, str(base_dir))
+    from src.pain_analyzers.kernels import precompile
+    if precompile():
+        print(f"✓ {'Numba kernels':30} - Compiled and cached")
+    else:
+        print(f"- {'Numba kernels':30} - Numba not installed (pure Python fallback)")
+except ImportError as e:
+    print(f"✗ {'Numba kernels':30} - Skipped ({e})")
+
 print()
 print("=" * 70)
 